@@ -0,0 +1,245 @@
+"""
+Asynchronous fetch-and-extract pipeline.
+
+Service files are ingested from a source (a local directory, or an HTTP
+server listing the Service_*.xls files) into a bounded asyncio queue
+while extraction workers consume it. Fetching one file and extracting
+another therefore overlap, instead of running one after the other over
+the whole batch.
+
+- Backpressure: a fetcher keeps its slot until its file is queued, so
+  while the workers are busy at most queue_size + fetchers files are
+  fetched ahead of them (queue_size in the queue, one per fetcher
+  waiting on the full queue).
+- Retry: a file whose fetch or extraction fails is retried up to
+  `retries` more times, with a growing delay, before its error is
+  reported.
+- Caching: with a ServiceRowCache, fetched files whose content is
+  unchanged are served from the cache instead of being extracted.
+
+serve_directory starts a local HTTP stand-in serving a directory, e.g.
+to exercise the HTTP source without the real download site.
+"""
+import asyncio
+import functools
+import html
+import os
+import re
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from excel_manip import find_service_files
+from instrumentation import recorder
+from n4_catalogue import N4_SERVICES_FILE_PATH, N4Catalogue
+from pop_raw import EXTRACTOR_VERSION, extract_service_record_safely, write_raw_data_sheet
+from service_cache import ServiceRowCache, file_content_hash
+
+SERVICE_FILE_LINK_PATTERN = re.compile(r'href="([^"]*Service_[^"/]*\.xls)"')
+
+
+class DirectorySource:
+    """
+    Reads service files from a local directory or glob pattern.
+    """
+
+    def __init__(self, input_path):
+        self.input_path = input_path
+        self.input_dir = ""
+
+    async def list_files(self):
+        self.input_dir, service_files = await asyncio.to_thread(find_service_files, self.input_path)
+        return service_files
+
+    async def fetch(self, service_file):
+        """
+        Returns the local path of a service file.
+        """
+        return os.path.join(self.input_dir, service_file)
+
+
+class HttpSource:
+    """
+    Downloads service files listed on an HTTP index page (e.g. a
+    directory listing) into a local download directory.
+
+    Parameters:
+    base_url (str): URL of the page linking to the Service_*.xls files.
+    download_dir (str): Directory the files are downloaded to.
+    timeout (float): Seconds before a request is abandoned.
+    """
+
+    def __init__(self, base_url, download_dir, timeout=30):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.download_dir = download_dir
+        self.timeout = timeout
+        self.file_urls = {}
+
+    def _read_url(self, url):
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return response.read()
+
+    async def list_files(self):
+        index = (await asyncio.to_thread(self._read_url, self.base_url)).decode("utf-8", errors="replace")
+        for link in SERVICE_FILE_LINK_PATTERN.findall(index):
+            url = urllib.parse.urljoin(self.base_url, html.unescape(link))
+            service_file = os.path.basename(urllib.parse.unquote(urllib.parse.urlparse(url).path))
+            self.file_urls[service_file] = url
+        return sorted(self.file_urls)
+
+    def _download(self, service_file):
+        content = self._read_url(self.file_urls[service_file])
+        file_path = os.path.join(self.download_dir, service_file)
+        temp_path = f"{file_path}.part"
+        with open(temp_path, "wb") as file:
+            file.write(content)
+        os.replace(temp_path, file_path)
+        return file_path
+
+    async def fetch(self, service_file):
+        """
+        Downloads a service file and returns its local path.
+        """
+        os.makedirs(self.download_dir, exist_ok=True)
+        return await asyncio.to_thread(self._download, service_file)
+
+
+def serve_directory(directory, host="127.0.0.1", port=0):
+    """
+    Serves a directory over HTTP from a background thread.
+
+    Returns:
+    tuple: (server, base URL); call server.shutdown() to stop it.
+    """
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+async def _with_retry(operation, retries, retry_delay):
+    # operation returns (result, error message or None) or raises
+    for attempt in range(retries + 1):
+        try:
+            result, error = await operation()
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        if error is None or attempt == retries:
+            return result, error
+        await asyncio.sleep(retry_delay * (attempt + 1))
+
+async def run_pipeline(source, workers=2, fetchers=4, queue_size=8, retries=2, retry_delay=0.5, cache=None):
+    """
+    Fetches and extracts every service file of a source concurrently.
+
+    Parameters:
+    source (DirectorySource or HttpSource): Where the service files come from.
+    workers (int): Number of extraction workers; more than one uses a process pool.
+    fetchers (int): Number of files fetched at the same time.
+    queue_size (int): Number of fetched files that may wait in the queue for a worker.
+    retries (int): Additional attempts for a failed fetch or extraction.
+    retry_delay (float): Seconds before the first retry; grows with each attempt.
+    cache (ServiceRowCache): Serves unchanged files without extracting them; optional.
+
+    Returns:
+    list: (service file name, ServiceRecord or None, error message or None)
+    tuples in the order listed by the source.
+    """
+    service_files = await source.list_files()
+    queue = asyncio.Queue(maxsize=queue_size)
+    fetch_slots = asyncio.Semaphore(fetchers)
+    results = {}
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else ThreadPoolExecutor(max_workers=1)
+    extract = functools.partial(extract_service_record_safely, instrument=recorder.enabled)
+
+    async def fetch(service_file):
+        async def attempt():
+            return await source.fetch(service_file), None
+
+        async with fetch_slots:
+            file_path, error = await _with_retry(attempt, retries, retry_delay)
+            if error is not None:
+                results[service_file] = (None, f"Fetch failed: {error}")
+                return
+            # Waits here while the queue is full, holding the slot so no other file is fetched meanwhile
+            await queue.put((service_file, file_path))
+
+    async def produce():
+        await asyncio.gather(*(fetch(service_file) for service_file in service_files))
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            service_file, file_path = item
+
+            file_hash = None
+            if cache is not None:
+                file_hash = await asyncio.to_thread(file_content_hash, file_path)
+                service_record = cache.get(service_file, file_hash)
+                if service_record is not None:
+                    results[service_file] = (service_record, None)
+                    continue
+
+            async def attempt():
+                service_record, error, measurements = await loop.run_in_executor(executor, extract, file_path)
+                recorder.merge(measurements)
+                return service_record, error
+
+            service_record, error = await _with_retry(attempt, retries, retry_delay)
+            if cache is not None and error is None:
+                cache.put(service_file, file_hash, service_record)
+            results[service_file] = (service_record, error)
+
+    try:
+        with recorder.stage("async_pipeline"):
+            await asyncio.gather(produce(), *(consume() for _ in range(workers)))
+    finally:
+        executor.shutdown()
+
+    if cache is not None:
+        cache.evict_missing(service_files)
+        cache.save()
+    return [(service_file,) + results[service_file] for service_file in service_files]
+
+def load_service_records_async(source, workers=2, cache=None, **options):
+    """
+    Runs the pipeline to completion from synchronous code.
+
+    Returns:
+    list: (service file name, ServiceRecord or None, error message or None) tuples.
+    """
+    return asyncio.run(run_pipeline(source, workers=workers, cache=cache, **options))
+
+def populate_raw_data_sheet_from_source(template_file_path, file_path, source, workers=2, cache_dir=None,
+                                        n4_services_file_path=N4_SERVICES_FILE_PATH, sinks=(), static_summaries=False,
+                                        shard_by=None):
+    """
+    Same as pop_raw.populate_raw_data_sheet, with the service files
+    fetched and extracted by the asynchronous pipeline.
+
+    Returns:
+    Workbook: The saved output workbook.
+    """
+    with recorder.stage("load_n4_services"):
+        n4_catalogue = N4Catalogue.load(n4_services_file_path, cache_dir)
+    cache = ServiceRowCache(cache_dir, EXTRACTOR_VERSION) if cache_dir else None
+    service_records = load_service_records_async(source, workers, cache)
+    print(f"Fetched {len(service_records)} service files")
+    if shard_by:
+        from shards import write_sharded_overviews
+
+        return write_sharded_overviews(template_file_path, file_path, service_records, n4_catalogue, shard_by, sinks,
+                                       cache_dir, static_summaries, workers)
+    return write_raw_data_sheet(template_file_path, file_path, service_records, n4_catalogue, sinks, cache_dir,
+                                static_summaries)
@@ -1,14 +1,32 @@
-import tkinter as tk
-from tkinter import filedialog
-from ctypes import windll
-from openpyxl import Workbook, load_workbook
+import argparse
+import cProfile
+import multiprocessing
+import sys
 
-from excel_manip import create_directory, convert_xls_to_xlsx, auto_size_columns, duplicate_excel_file, set_list_of_pivot_tables_refresh_on_load
+from excel_manip import create_directory, find_service_files, convert_xls_to_xlsx
+from instrumentation import recorder
+from n4_catalogue import N4_SERVICES_FILE_PATH
 from pop_raw import populate_raw_data_sheet
+from shards import SHARD_HEADERS
+from sinks import create_sink
 
+# Defaults match the layout of the tool's working directory
+DEFAULT_INPUT = "xls"
+DEFAULT_TEMPLATE = "SO_Template.xlsx"
+DEFAULT_OUTPUT = "Service Overview.xlsx"
+DEFAULT_CACHE_DIR = ".so_cache"
+
+
+# The GUI and Windows-only modules are imported where they are used so
+# that the command-line tool starts quickly and runs on Linux
+def set_dpi_awareness():
+    from ctypes import windll
+    windll.shcore.SetProcessDpiAwareness(1)
 
 def select_file():
     global output_file_path
+    import tkinter as tk
+    from tkinter import filedialog
     output_file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
     if output_file_path:
         file_entry.delete(0, tk.END)
@@ -23,6 +41,7 @@ def submit():
 def create_gui(gui_title):
     global file_entry
     global app  # Declare app as a global variable
+    import tkinter as tk
     app = tk.Tk()
     app.geometry("700x350")
     app.title(gui_title)
@@ -42,36 +61,83 @@ def create_gui(gui_title):
 
     app.mainloop()
 
-def main():
+def main(workers=1, report_path=None, profile_path=None, input_path=DEFAULT_INPUT,
+         template_file_path=DEFAULT_TEMPLATE, output_file_path=DEFAULT_OUTPUT,
+         cache_dir=DEFAULT_CACHE_DIR, xlsx_dir=None, n4_services_file_path=N4_SERVICES_FILE_PATH, sink_paths=(),
+         source_url=None, static_summaries=False, shard_by=None, chunk_size=None):
+    """
+    Creates the Service Overview from the downloaded service files.
+
+    Parameters:
+    workers (int): Number of processes used to extract the service files and to write the shards.
+    report_path (str): Write a JSON timing report of the run to this file.
+    profile_path (str): Dump cProfile statistics of the run to this file.
+    input_path (str): Directory containing the Service_*.xls files, or a glob pattern.
+    template_file_path (str): The path of the template workbook.
+    output_file_path (str): The path of the Service Overview workbook to create.
+    cache_dir (str): Directory of the extracted rows cache; None disables caching.
+    xlsx_dir (str): Debug: also write .xlsx copies of the service files here.
+    n4_services_file_path (str): The path of the N4 service list.
+    sink_paths (list): Also write the raw rows to these .csv, .sqlite or .parquet files.
+    source_url (str): Download the service files listed at this URL into input_path
+    (a directory) and extract them while they arrive; chunk_size and xlsx_dir are not
+    supported with it.
+    static_summaries (bool): Write summary sheets by PORT, LEAD SL and MICT SERVICE NAME
+    in place of the pivot table sheets, which are removed from the overview.
+    shard_by (str): Also write one overview per value of this raw sheet column
+    ("PORT" or "LEAD SL") next to the combined overview.
+    chunk_size (int): Extract the service files chunk_size at a time and keep the rows
+    on disk, so memory stays flat for very large batches.
+
+    Returns:
+    bool: Whether the Service Overview was created.
+    """
+    recorder.reset()
+    recorder.enabled = report_path is not None
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler:
+        profiler.enable()
+
     try:
-        # windll.shcore.SetProcessDpiAwareness(1)
+        # set_dpi_awareness()
 
         # Initialize the GUI
         # create_gui("Create Service Overview")
         # app.mainloop()
-        
-        xls_dir = "xls"
-        xlsx_dir = "xlsx"
-        template_file_path = "SO_Template.xlsx"
-        output_file_name = "Service Overview.xlsx"
-        output_file_path = output_file_name
-
-        # Convert downloaded .xls to .xlsx Service files
-        create_directory("xlsx")
-        service_files = convert_xls_to_xlsx(xls_dir, xlsx_dir)
-        
-        # Duplicate workbook as output file
-        duplicate_excel_file(template_file_path, output_file_path)
-        
-        # Populate "raw" sheet
-        output_workbook = populate_raw_data_sheet(output_file_path, service_files, xlsx_dir)
-        raw_sheet = output_workbook["raw"]
-        auto_size_columns(raw_sheet)
 
-        # Set the refreshOnLoad attribute = True for all pivot tables in the workbook
-        set_list_of_pivot_tables_refresh_on_load(output_file_path)
+        sinks = [create_sink(sink_path) for sink_path in sink_paths]
 
+        if source_url:
+            # The downloaded files are extracted as they arrive, so neither is supported there
+            if chunk_size:
+                raise ValueError("Chunked mode cannot be combined with a source URL")
+            if xlsx_dir:
+                raise ValueError("Converting to .xlsx cannot be combined with a source URL")
+
+            from async_pipeline import HttpSource, populate_raw_data_sheet_from_source
+
+            source = HttpSource(source_url, input_path)
+            with recorder.stage("populate_raw_data_sheet"):
+                workbook = populate_raw_data_sheet_from_source(template_file_path, output_file_path, source,
+                                                               max(workers, 1), cache_dir, n4_services_file_path, sinks,
+                                                               static_summaries, shard_by)
+            return workbook is not None
+
+        # Service files are read straight from the downloaded .xls files
+        input_dir, service_files = find_service_files(input_path)
+        if xlsx_dir:
+            with recorder.stage("convert"):
+                create_directory(xlsx_dir)
+                convert_xls_to_xlsx(input_dir, xlsx_dir, service_files)
         
+        # Populate "raw" sheet of a copy of the template; pivot tables are set
+        # to refresh on load and columns are sized in the same pass
+        with recorder.stage("populate_raw_data_sheet"):
+            workbook = populate_raw_data_sheet(template_file_path, output_file_path, service_files, input_dir,
+                                               workers, cache_dir, n4_services_file_path, sinks, static_summaries,
+                                               shard_by, chunk_size)
+        return workbook is not None
+
     # Handle exceptions
     except FileNotFoundError as fnf_error:
         print(f"Error: {fnf_error}. Please enter a valid username")
@@ -79,5 +145,148 @@ def main():
     except Exception as e:
         print(f"An error occured: {e}")
 
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            print(f"Profile written to: {profile_path}")
+        if report_path:
+            recorder.write_report(report_path)
+            print(f"Timing report written to: {report_path}")
+    return False
+
+def positive_int(value):
+    """
+    argparse type of the options that must be at least 1.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+    return number
+
+def add_run_arguments(parser):
+    parser.add_argument("-i", "--input", dest="input_path", default=DEFAULT_INPUT,
+                        help="Directory containing the Service_*.xls files, or a glob pattern (default: %(default)s).")
+    parser.add_argument("-t", "--template", dest="template_file_path", default=DEFAULT_TEMPLATE,
+                        help="Template workbook (default: %(default)s).")
+    parser.add_argument("-o", "--output", dest="output_file_path", default=DEFAULT_OUTPUT,
+                        help="Service Overview workbook to create (default: %(default)s).")
+    parser.add_argument("-w", "--workers", type=positive_int, default=1,
+                        help="Number of processes used to extract the service files and to write the shards "
+                             "(default: %(default)s).")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Directory of the extracted rows cache (default: %(default)s).")
+    parser.add_argument("--no-cache", dest="cache_dir", action="store_const", const=None,
+                        help="Extract every service file without using the cache.")
+    parser.add_argument("--n4-services", dest="n4_services_file_path", default=N4_SERVICES_FILE_PATH,
+                        help="N4 service list (default: %(default)s).")
+    parser.add_argument("--xlsx-debug-dir", dest="xlsx_dir",
+                        help="Also write .xlsx copies of the service files to this directory.")
+    parser.add_argument("--sink", dest="sink_paths", action="append", default=[], metavar="PATH",
+                        help="Also write the raw rows to a .csv, .sqlite/.db or .parquet file (repeatable).")
+    parser.add_argument("--static-summaries", action="store_true",
+                        help="Write summary sheets by PORT, LEAD SL and MICT SERVICE NAME in place of the "
+                             "pivot table sheets, which are removed from the overview.")
+    parser.add_argument("--report", dest="report_path", help="Write a JSON timing report of the run to this file.")
+    parser.add_argument("--profile", dest="profile_path", help="Dump cProfile statistics of the run to this file.")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="auto_so", description="Create the Service Overview from downloaded Alphaliner service files.")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+
+    run_parser = subparsers.add_parser("run", help="Create the Service Overview once (default).")
+    add_run_arguments(run_parser)
+    run_parser.add_argument("--source-url", help="Download the service files listed at this URL into the input "
+                                                 "directory, extracting them as they arrive.")
+    run_parser.add_argument("--shard-by", choices=sorted(SHARD_HEADERS),
+                            help="Also write one overview per port or lead shipping line next to the combined one.")
+    run_parser.add_argument("--chunk-size", type=positive_int, metavar="N",
+                            help="Extract the service files N at a time and keep the rows on disk, so memory "
+                                 "stays flat for very large batches.")
+    run_parser.set_defaults(handler=run_command)
+
+    watch_parser = subparsers.add_parser("watch", help="Keep the Service Overview up to date as service files are downloaded.")
+    add_run_arguments(watch_parser)
+    watch_parser.add_argument("--poll-interval", type=float, default=1.0,
+                              help="Seconds between two scans of the input (default: %(default)s).")
+    watch_parser.add_argument("--debounce", type=float, default=2.0,
+                              help="Seconds without changes before the overview is rebuilt (default: %(default)s).")
+    watch_parser.set_defaults(handler=watch_command)
+
+    query_parser = subparsers.add_parser("query", help="Look up vessels, operators and services in the index "
+                                                       "saved by the last run, without opening any workbook.")
+    query_lookup = query_parser.add_mutually_exclusive_group(required=True)
+    query_lookup.add_argument("--vessel", help="List the services a vessel is deployed on.")
+    query_lookup.add_argument("--operator", help="List the vessels operated by an operator.")
+    query_lookup.add_argument("--service", help="Show the participants of a service.")
+    query_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                              help="Directory of the cache holding the index (default: %(default)s).")
+    query_parser.set_defaults(handler=query_command)
+    return parser
+
+def run_command(args):
+    created = main(workers=args.workers, report_path=args.report_path, profile_path=args.profile_path,
+                   input_path=args.input_path, template_file_path=args.template_file_path,
+                   output_file_path=args.output_file_path, cache_dir=args.cache_dir,
+                   xlsx_dir=args.xlsx_dir, n4_services_file_path=args.n4_services_file_path,
+                   sink_paths=args.sink_paths, source_url=args.source_url,
+                   static_summaries=args.static_summaries,
+                   shard_by=SHARD_HEADERS[args.shard_by] if args.shard_by else None,
+                   chunk_size=args.chunk_size)
+    return 0 if created else 1
+
+def watch_command(args):
+    from watch import ServiceOverviewWatcher
+
+    watcher = ServiceOverviewWatcher(args.input_path, args.template_file_path, args.output_file_path,
+                                     workers=args.workers, cache_dir=args.cache_dir, xlsx_dir=args.xlsx_dir,
+                                     n4_services_file_path=args.n4_services_file_path,
+                                     poll_interval=args.poll_interval, debounce=args.debounce,
+                                     sink_paths=args.sink_paths, static_summaries=args.static_summaries)
+    watcher.run()
+    return 0
+
+def query_command(args):
+    import os
+    from vessel_index import VESSEL_INDEX_FILE_NAME, VesselIndex
+
+    index_path = os.path.join(args.cache_dir, VESSEL_INDEX_FILE_NAME)
+    try:
+        index = VesselIndex.load(index_path)
+    except FileNotFoundError:
+        print(f"Error: no vessel index at {index_path}. Create the Service Overview with caching enabled first.")
+        return 1
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    if args.vessel is not None:
+        results = index.services_for_vessel(args.vessel)
+    elif args.operator is not None:
+        results = index.vessels_for_operator(args.operator)
+    else:
+        participants = index.participants_for_service(args.service)
+        results = [] if participants is None else [participants]
+
+    if not results:
+        print("No match found.")
+        return 1
+    for result in results:
+        print(result)
+    return 0
+
+def cli(argv=None):
+    """
+    Runs the command line interface and returns the exit status.
+    "run" is implied when no command is given, e.g. "auto_so -i xls -w 4".
+    """
+    parser = build_parser()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + argv
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
 if __name__ == "__main__":
-    main()
+    multiprocessing.freeze_support()  # Needed for the process pool in the PyInstaller executable
+    sys.exit(cli())
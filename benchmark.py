@@ -0,0 +1,332 @@
+"""
+Batch benchmark for the Service Overview pipeline.
+
+Generates N synthetic Service_*.xls files laid out like the Alphaliner
+downloads that pop_raw.py expects, then times the full auto_so.main()
+run and each stage (convert, extract, write, prepare template) separately.
+
+Every measurement runs in a fresh process so that the reported peak RSS
+belongs to that measurement alone.
+
+--check-backpressure instead checks that the asynchronous pipeline
+(see async_pipeline.py) stops fetching while its worker is stalled.
+
+Usage:
+    python benchmark.py --sizes 10 100 1000 --workers 1 4 --output bench.json
+    python benchmark.py --check-backpressure
+
+Generating the .xls files requires xlwt (pip install xlwt).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_FILE_NAME = "SO_Template.xlsx"
+N4_SERVICES_FILE_NAME = "n4_svcs.xlsx"
+
+SHIPPING_LINES = ["CNC", "COSCO", "Evergreen", "Asean Seas Line", "TS Lines", "KMTC"]
+OPERATORS = ["APL", "COSCO SHIPPING Lines", "Evergreen Line", "Asean Seas Line Co (ASL)", "TS Lines", "KMTC"]
+PORT_CALLS = ["North Port", "South Harbor", "North and South Harbor"]
+
+
+def generate_service_file(file_path, service_number, vessel_count=5):
+    """
+    Writes a synthetic Alphaliner service file.
+
+    Row positions mirror the real downloads: the sheet starts with an
+    empty row, the description sits in D4 (D3 once the first row is
+    dropped), labels are in column C with their values in column D, and
+    the vessel block lists operators in column K.
+
+    Parameters:
+    file_path (str): Path of the .xls file to create.
+    service_number (int): Number used to derive the service's values.
+    vessel_count (int): Number of vessels in the "Ships deployed" block.
+    """
+    import xlwt
+
+    shipping_line = SHIPPING_LINES[service_number % len(SHIPPING_LINES)]
+    service_code = f"S{service_number:04d}"
+    port_call = PORT_CALLS[service_number % len(PORT_CALLS)]
+
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet("Service")
+
+    sheet.write(1, 3, "Alphaliner - Service data")
+    sheet.write(3, 3, f"{shipping_line} - China-Philippines service ({service_code})")
+
+    sheet.write(6, 2, "Participants")
+    for column, header in enumerate(["Carrier", "Status", "Service Branding", "Remarks / Info"], start=2):
+        sheet.write(7, column, header)
+    sheet.write(8, 2, shipping_line)
+    sheet.write(8, 3, "Vessel provider")
+    sheet.write(9, 2, SHIPPING_LINES[(service_number + 1) % len(SHIPPING_LINES)])
+    sheet.write(9, 3, "Slotter")
+
+    sheet.write(13, 2, "Coverage")
+    sheet.write(13, 3, "Intra Asia services - NE Asia-SE Asia")
+    sheet.write(16, 2, "Type")
+    sheet.write(16, 3, "CON")
+    sheet.write(19, 2, "Sailing frequency")
+    sheet.write(19, 3, 7.0)
+    sheet.write(22, 2, "Duration of rotation")
+    sheet.write(22, 3, 7.0 * vessel_count)
+    sheet.write(25, 2, "Proforma fleet")
+    sheet.write(25, 3, f"{vessel_count} ships (from 1,700 - 2,800 teu)")
+    sheet.write(28, 2, "Weekly capacity (teu)")
+    sheet.write(28, 3, 1000.0 + service_number)
+    sheet.write(31, 2, "Port rotation")
+    sheet.write(32, 2, "Qingdao, Shanghai, Ningbo (incl Zhoushan), Manila, Qingdao")
+    sheet.write(35, 2, "Comments")
+    sheet.write(36, 2, (f"Comments - Rotation and Port Coverage\n\n > Manila called at {port_call}\n\n"
+                        f"Comments - Service Chronology\n\n > Service launched by {shipping_line}."))
+
+    sheet.write(39, 2, "Ships deployed")
+    for column, header in enumerate(["Vessel name", "Type", "Flag", "DWT", "TEU", "TEU 14",
+                                     "Speed", "Gear", "Operator", "Open date"], start=2):
+        sheet.write(40, column, header)
+    for vessel in range(vessel_count):
+        row = 41 + vessel
+        sheet.write(row, 2, f"{shipping_line.upper()} VESSEL {service_number}-{vessel}")
+        sheet.write(row, 3, "cc")
+        sheet.write(row, 4, "PAN")
+        sheet.write(row, 5, 23000.0 + vessel)
+        sheet.write(row, 6, 1700.0 + vessel * 100)
+        sheet.write(row, 10, OPERATORS[(service_number + vessel) % len(OPERATORS)])
+        sheet.write(row, 11, "(own)")
+
+    sheet.write(43 + vessel_count, 2, "All information above is given as guidance only")
+    workbook.save(file_path)
+
+def generate_service_files(directory, count, vessel_count=5):
+    """
+    Writes count synthetic Service_*.xls files into a directory.
+
+    Returns:
+    list: The names of the generated files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    service_files = []
+    for service_number in range(count):
+        service_file = f"Service_{service_number}.xls"
+        generate_service_file(os.path.join(directory, service_file), service_number, vessel_count)
+        service_files.append(service_file)
+    return service_files
+
+def create_workspace(root_dir, count, vessel_count=5):
+    """
+    Creates a directory laid out like the tool's working directory:
+    xls/ with the synthetic downloads, plus the template and N4 list.
+    """
+    workspace = os.path.join(root_dir, f"workspace_{count}")
+    generate_service_files(os.path.join(workspace, "xls"), count, vessel_count)
+    for file_name in (TEMPLATE_FILE_NAME, N4_SERVICES_FILE_NAME):
+        shutil.copy(os.path.join(PACKAGE_DIR, file_name), os.path.join(workspace, file_name))
+    return workspace
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process and its
+    finished children in MB, or None where the resource module
+    is not available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / scale
+
+def run_stage(stage, workspace, workers):
+    """
+    Runs one stage inside the workspace and returns its wall time.
+    Any setup the stage needs is done before the clock starts.
+    """
+    sys.path.insert(0, PACKAGE_DIR)
+    os.chdir(workspace)
+
+    import auto_so
+    from excel_manip import convert_xls_to_xlsx, create_directory, list_service_files
+    from pop_raw import load_service_records, write_raw_data_sheet
+    from prepared_template import prepared_template_path
+
+    output_file_path = "Service Overview.xlsx"
+    service_files = list_service_files("xls")
+
+    if stage == "full":
+        # Start from a cold extracted rows cache
+        shutil.rmtree(".so_cache", ignore_errors=True)
+        start = time.perf_counter()
+        auto_so.main(workers=workers)
+        return time.perf_counter() - start
+
+    if stage == "convert":
+        create_directory("xlsx")
+        start = time.perf_counter()
+        convert_xls_to_xlsx("xls", "xlsx")
+        return time.perf_counter() - start
+
+    if stage == "prepare template":
+        # The template-level work of a run: emptying "raw", the header row and
+        # the pivot refresh flags, saved once per template (see prepared_template.py)
+        shutil.rmtree(".so_cache", ignore_errors=True)
+        start = time.perf_counter()
+        prepared_template_path(TEMPLATE_FILE_NAME, ".so_cache")
+        return time.perf_counter() - start
+
+    if stage == "extract":
+        start = time.perf_counter()
+        for _ in load_service_records(service_files, "xls", workers):
+            pass
+        return time.perf_counter() - start
+
+    service_records = list(load_service_records(service_files, "xls", workers))
+    if stage == "write":
+        start = time.perf_counter()
+        write_raw_data_sheet(TEMPLATE_FILE_NAME, output_file_path, service_records)
+        return time.perf_counter() - start
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+def _measure(stage, workspace, workers):
+    # Runs in a fresh worker process; output of the pipeline is silenced
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            wall_time = run_stage(stage, workspace, workers)
+        finally:
+            sys.stdout = stdout
+    return wall_time, peak_rss_mb()
+
+def measure(stage, workspace, workers):
+    """
+    Runs a stage in a separate process and returns its wall time and peak RSS.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_measure, stage, workspace, workers).result()
+
+STAGES = ["full", "convert", "extract", "write", "prepare template"]
+
+def run_benchmarks(sizes, workers_options, stages=STAGES, vessel_count=5, keep_dir=None):
+    """
+    Runs every stage for every batch size and worker count.
+
+    Returns:
+    list: One result dict per measurement.
+    """
+    root_dir = keep_dir or tempfile.mkdtemp(prefix="so_bench_")
+    results = []
+    try:
+        for count in sizes:
+            workspace = create_workspace(root_dir, count, vessel_count)
+            for workers in workers_options:
+                for stage in stages:
+                    # Stages other than extraction do not use the process pool
+                    if workers != workers_options[0] and stage in ("convert", "prepare template"):
+                        continue
+                    wall_time, peak_rss = measure(stage, workspace, workers)
+                    result = {
+                        "files": count,
+                        "workers": workers,
+                        "stage": stage,
+                        "wall_time_s": round(wall_time, 4),
+                        "files_per_s": round(count / wall_time, 2) if wall_time > 0 else None,
+                        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+                    }
+                    results.append(result)
+                    print(format_result(result), flush=True)
+    finally:
+        if keep_dir is None:
+            shutil.rmtree(root_dir, ignore_errors=True)
+    return results
+
+class _CountingSource:
+    # Lists file_count service files and counts the fetches; nothing is read from disk
+    def __init__(self, file_count):
+        self.service_files = [f"Service_{number}.xls" for number in range(1, file_count + 1)]
+        self.fetch_count = 0
+
+    async def list_files(self):
+        return list(self.service_files)
+
+    async def fetch(self, service_file):
+        self.fetch_count += 1
+        return service_file
+
+def _check_backpressure(file_count, queue_size, fetchers, extract_delay):
+    # Runs in a fresh worker process, as the extraction of async_pipeline is replaced
+    import asyncio
+
+    sys.path.insert(0, PACKAGE_DIR)
+    import async_pipeline
+
+    source = _CountingSource(file_count)
+    started = []
+    fetched_ahead = []
+
+    def stalled_extract(file_path, instrument=False):
+        started.append(file_path)
+        fetched_ahead.append(source.fetch_count - len(started))
+        time.sleep(extract_delay)
+        return None, "not extracted", None
+
+    async_pipeline.extract_service_record_safely = stalled_extract
+    asyncio.run(async_pipeline.run_pipeline(source, workers=1, fetchers=fetchers, queue_size=queue_size, retries=0))
+    return max(fetched_ahead, default=0), len(started)
+
+def check_backpressure(file_count=40, queue_size=2, fetchers=4, extract_delay=0.2):
+    """
+    Runs the asynchronous pipeline with a single worker whose extraction
+    sleeps extract_delay seconds, and checks that no more than
+    queue_size + fetchers files are fetched ahead of the worker.
+
+    Returns:
+    bool: Whether the check passed.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        max_fetched_ahead, extracted = executor.submit(_check_backpressure, file_count, queue_size, fetchers,
+                                                       extract_delay).result()
+    limit = queue_size + fetchers
+    passed = extracted == file_count and max_fetched_ahead <= limit
+    print(f"Backpressure: at most {max_fetched_ahead} files fetched ahead of the worker "
+          f"(limit {limit}, {extracted} of {file_count} extracted): {'OK' if passed else 'FAILED'}")
+    return passed
+
+def format_result(result):
+    peak_rss = "n/a" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.1f} MB"
+    return (f"{result['files']:>6} files  workers={result['workers']:<3} {result['stage']:<17}"
+            f"{result['wall_time_s']:>10.3f} s {result['files_per_s'] or 0:>10.1f} files/s  peak RSS {peak_rss}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Service Overview pipeline on synthetic service files.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Batch sizes to generate.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker counts to run the pipeline with.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to measure.")
+    parser.add_argument("--vessels", type=int, default=5, help="Vessels per synthetic service.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--keep-dir", help="Generate the workspaces here and keep them.")
+    parser.add_argument("--check-backpressure", action="store_true",
+                        help="Only check that the asynchronous pipeline stops fetching while its worker is stalled.")
+    args = parser.parse_args(argv)
+
+    if args.check_backpressure:
+        return 0 if check_backpressure() else 1
+
+    results = run_benchmarks(args.sizes, args.workers, args.stages, args.vessels, args.keep_dir)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
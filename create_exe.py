@@ -1,13 +1,77 @@
+import argparse
+import os
 import subprocess
+import sys
+import time
 
-def run_pyinstaller_onefile(script_file):
+# Never used at run time: pandas is only needed by service_text.parse_service_texts
+# when it is handed a Series, and openpyxl works without numpy
+EXCLUDED_MODULES = ["pandas", "numpy"]
+
+def run_pyinstaller_onefile(script_file, excluded_modules=EXCLUDED_MODULES):
     try:
         # Run the PyInstaller command with the given script file
-        subprocess.run(['pyinstaller', '--onefile', "--distpath", ".", script_file], check=True)
+        command = ['pyinstaller', '--onefile', "--distpath", ".", script_file]
+        for module in excluded_modules:
+            command += ["--exclude-module", module]
+        subprocess.run(command, check=True)
         print(f"Successfully created the executable for {script_file}")
     except subprocess.CalledProcessError as e:
         print(f"An error occurred: {e}")
 
+def measure_import_times(module_name):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    Parameters:
+    module_name (str): The module to import, e.g. "auto_so".
+
+    Returns:
+    list: (module, self time in s, cumulative time in s) tuples in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    import_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        import_times.append((module.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return import_times
+
+def print_import_time_report(module_name, top=15):
+    """
+    Prints the total import time of a module and the imports that
+    contribute most to it.
+    """
+    import_times = measure_import_times(module_name)
+    total = sum(self_time for _, self_time, _ in import_times)
+    print(f"Importing {module_name} takes {total:.3f} s over {len(import_times)} modules")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for module, self_time, cumulative_time in sorted(import_times, key=lambda entry: entry[2], reverse=True)[:top]:
+        print(f"{cumulative_time:>11.3f}s {self_time:>9.3f}s  {module}")
+
+def measure_startup(command, runs=5):
+    """
+    Returns the fastest wall time in seconds of running a command,
+    e.g. the packaged executable with --help.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
 if __name__ == "__main__":
-    # Replace 'your_script.py' with the name of your Python script
-    run_pyinstaller_onefile('auto_so.py')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the auto_so executable and report its startup cost.")
+    parser.add_argument("--report-only", action="store_true", help="Only print the import-time report.")
+    args = parser.parse_args()
+
+    print_import_time_report("auto_so")
+    if not args.report_only:
+        run_pyinstaller_onefile('auto_so.py')
+        executable = os.path.abspath("auto_so.exe" if sys.platform == "win32" else "auto_so")
+        if os.path.exists(executable):
+            print(f"Executable starts in {measure_startup([executable, '--help']):.3f} s")
@@ -1,10 +1,12 @@
+import glob
 import os
 import shutil
 
-import pandas as pd
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.table import Table
+from instrumentation import recorder
+from service_document import ServiceDocument
+
+# openpyxl is imported inside the functions that use it to keep the
+# command line and the extraction workers fast to start
 
 def create_directory(dir_name):
     """
@@ -34,18 +36,16 @@ def create_sheet(output_workbook, sheet_name):
     output_sheet = output_workbook.create_sheet(sheet_name)
     return output_sheet
 
-def convert_xls_to_xlsx(input_folder, output_folder):
+def list_service_files(input_folder):
     """
-    Converts all .xls files in a directory, outputs
-    .xlsx to another directory, and returns a list
-    of the output file names.
+    Returns the names of the downloaded service files (Service_*.xls)
+    found in a directory.
 
     Parameters:
     input_folder (str): File path of directory containing .xls files.
-    output_folder (str): File path of directory where .xlsx files are created.
 
     Returns:
-    list: The list of .xlsx file names created
+    list: The list of service file names, sorted by name
 
     Raises:
     ValueError: If there are no service files found in the directory.
@@ -57,21 +57,74 @@ def convert_xls_to_xlsx(input_folder, output_folder):
     if not xls_files:
         raise ValueError(f"No service files found in the following directory: {input_folder}")
 
+    # Sorted so that the "raw" sheet rows come out in a stable order
+    return sorted(xls_files)
+
+def find_service_files(input_path):
+    """
+    Resolves the service files to process from a directory or a glob
+    pattern (e.g. "downloads/*/Service_*.xls").
+
+    Parameters:
+    input_path (str): Directory containing the Service_*.xls files, or a glob pattern.
+
+    Returns:
+    tuple: (input directory, list of service files relative to it). For a
+    glob pattern the directory is "" and the files are the matched paths.
+
+    Raises:
+    ValueError: If no service files are found.
+    """
+    if os.path.isdir(input_path):
+        return input_path, list_service_files(input_path)
+
+    xls_files = sorted(path for path in glob.glob(input_path, recursive=True)
+                       if os.path.isfile(path) and path.endswith(".xls"))
+    if not xls_files:
+        raise ValueError(f"No service files match the following pattern: {input_path}")
+    return "", xls_files
+
+def convert_xls_to_xlsx(input_folder, output_folder, xls_files=None):
+    """
+    Converts all .xls files in a directory, outputs
+    .xlsx to another directory, and returns a list
+    of the output file names.
+
+    Extraction reads the .xls files directly; the .xlsx
+    copies are only written for debugging.
+
+    Parameters:
+    input_folder (str): File path of directory containing .xls files.
+    output_folder (str): File path of directory where .xlsx files are created.
+    xls_files (list): Files to convert, relative to input_folder; defaults to its Service_*.xls files.
+
+    Returns:
+    list: The list of .xlsx file names created
+
+    Raises:
+    ValueError: If there are no service files found in the directory.
+    """
+    if xls_files is None:
+        xls_files = list_service_files(input_folder)
 
     for xls_file in xls_files:
         input_path = os.path.join(input_folder, xls_file)
-        output_path = os.path.join(output_folder, xls_file.replace(".xls", ".xlsx"))
+        output_path = os.path.join(output_folder, os.path.basename(xls_file).replace(".xls", ".xlsx"))
 
         # Copy over data into the new .xlsx file
-        df_xls = pd.read_excel(input_path)
+        with recorder.stage("convert_read_xls"):
+            service_document = ServiceDocument.from_xls(input_path)
+            recorder.count_workbook_load(os.path.basename(xls_file))
 
-        wb_xlsx = Workbook()
-        sheet_xlsx = wb_xlsx.active
+        with recorder.stage("convert_write_xlsx"):
+            from openpyxl import Workbook
+            wb_xlsx = Workbook()
+            sheet_xlsx = wb_xlsx.active
 
-        for row in df_xls.iterrows():
-            sheet_xlsx.append(row[1].tolist())
+            for row in service_document.rows:
+                sheet_xlsx.append(row)
 
-        wb_xlsx.save(output_path)
+            wb_xlsx.save(output_path)
 
     service_files = [file for file in os.listdir(output_folder)]
 
@@ -89,16 +142,22 @@ def extract_cell(file_path, cell_reference):
     Returns:
     Various: The data from the cell extracted.
     """
+    from openpyxl import load_workbook
+
     try:
-        workbook = load_workbook(file_path)
-        sheet = workbook.active
         if cell_reference == None:
             return None
-        return sheet[cell_reference].value
+        workbook = load_workbook(file_path, read_only=True)
+        sheet = workbook.active
+        value = sheet[cell_reference].value
+        workbook.close()
+        return value
     except Exception as e:
         print(f"Error: {e}")
 
 def auto_size_columns(worksheet):
+    from openpyxl.utils import get_column_letter
+
     for column_cells in worksheet.columns:
         max_length = 0
         for cell in column_cells:
@@ -108,6 +167,51 @@ def auto_size_columns(worksheet):
         column_letter = get_column_letter(cell.column)
         worksheet.column_dimensions[column_letter].width = adjusted_width
 
+class SheetWriter:
+    """
+    Appends rows to a worksheet while keeping a running maximum of
+    the value lengths of each column, so that column widths are known
+    once the last row is written without traversing the sheet again.
+
+    Parameters:
+    worksheet (Worksheet): The sheet the rows are appended to.
+    padding (int): Extra width added to the longest value of each column.
+    """
+
+    def __init__(self, worksheet, padding=2):
+        self.worksheet = worksheet
+        self.padding = padding
+        self.max_lengths = []
+
+    def append(self, row):
+        row = list(row)
+        self.worksheet.append(row)
+        self.track(row)
+
+    def track(self, row):
+        """
+        Accounts for the value lengths of a row already in the sheet,
+        e.g. the header of a prepared template.
+        """
+        max_lengths = self.max_lengths
+        if len(row) > len(max_lengths):
+            max_lengths.extend([0] * (len(row) - len(max_lengths)))
+        for index, value in enumerate(row):
+            if value is not None:
+                length = len(str(value))
+                if length > max_lengths[index]:
+                    max_lengths[index] = length
+
+    def apply_column_widths(self):
+        """
+        Sets the width of every written column to its longest value plus padding.
+        """
+        from openpyxl.utils import get_column_letter
+
+        for index, max_length in enumerate(self.max_lengths, start=1):
+            column_letter = get_column_letter(index)
+            self.worksheet.column_dimensions[column_letter].width = max_length + self.padding
+
 def duplicate_excel_file(source_path, destination_path):
     try:
         # Copy the source Excel file to the destination with a new name
@@ -116,18 +220,55 @@ def duplicate_excel_file(source_path, destination_path):
     except Exception as e:
         print(f"Error: {e}")
 
-def set_list_of_pivot_tables_refresh_on_load(workbook_path):
-    workbook = load_workbook(workbook_path)
+def set_pivot_tables_refresh_on_load(workbook, refresh_on_load=True):
+    """
+    Sets refreshOnLoad on the cache of every pivot table
+    of an already loaded workbook.
+
+    Parameters:
+    workbook (Workbook): The workbook containing the pivot tables.
+    refresh_on_load (bool): Whether Excel refreshes the pivot tables when the workbook is opened.
+    """
     for sheet in workbook:
         for pivot in sheet._pivots:
-            pivot.cache.refreshOnLoad = True
+            pivot.cache.refreshOnLoad = refresh_on_load
+
+def remove_pivot_table_sheets(workbook):
+    """
+    Deletes every sheet holding a pivot table, together with its pivot
+    caches, from an already loaded workbook.
+
+    Parameters:
+    workbook (Workbook): The workbook containing the pivot tables.
+
+    Returns:
+    list: Titles of the removed sheets.
+    """
+    active_sheet = workbook.active
+    pivot_sheets = [sheet for sheet in workbook if sheet._pivots]
+    for sheet in pivot_sheets:
+        workbook.remove(sheet)
+    if pivot_sheets:
+        # Keeps the same sheet active, or the first one if it was removed
+        workbook.active = 0 if active_sheet in pivot_sheets else workbook.worksheets.index(active_sheet)
+    return [sheet.title for sheet in pivot_sheets]
+
+def set_list_of_pivot_tables_refresh_on_load(workbook_path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(workbook_path)
+    set_pivot_tables_refresh_on_load(workbook)
     workbook.save(workbook_path)
 
 def get_cell_reference(row, column):
+    from openpyxl.utils import get_column_letter
+
     column_letter = get_column_letter(column)
     return f"{column_letter}{row}"
 
 def get_sheet_dimensions(workbook_path, sheet_name):
+    from openpyxl import load_workbook
+
     workbook = load_workbook(workbook_path)
     sheet = workbook[sheet_name]
     return (sheet.max_row, sheet.max_column)
\ No newline at end of file
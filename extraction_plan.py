@@ -0,0 +1,230 @@
+"""
+Declarative extraction of the "raw" sheet fields.
+
+Each field is described by a FieldSpec: where its value sits in the
+service sheet (a fixed cell, or relative to an anchor label), or how it
+is derived from other fields. An ExtractionPlan gathers the specs, finds
+every anchor in one sweep over the sheet rows, then applies the
+transforms and derivations. Adding a column means adding a spec, not
+another scan of the sheet.
+
+The plan also decides how much of a sheet is read (read_rows): reading
+stops once every anchor of the plan is resolved, so the rows kept by a
+ServiceDocument always cover the specs.
+"""
+from collections import namedtuple
+
+from records import VesselRow
+from service_document import coordinate_to_tuple
+
+# Where a field's value is found
+CELL = "cell"                  # A fixed cell, e.g. "D3"
+RIGHT = "right"                # Right of the first anchor label in column C
+BELOW = "below"                # Below the first anchor label at or after row 25, column C or later
+PARTICIPANTS = "participants"  # Column C carriers keyed by their column D participant type
+VESSELS = "vessels"            # Column C vessel names (column K operator) after the anchor header
+DERIVED = "derived"            # Computed from other fields
+
+LABEL_COLUMN = 3
+VALUE_COLUMN = 4
+OPERATOR_COLUMN = 11
+BELOW_MIN_ROW = 25
+
+FieldSpec = namedtuple("FieldSpec", ["header", "direction", "anchor", "transform", "depends_on"])
+FieldSpec.__new__.__defaults__ = (None, None, ())
+FieldSpec.__doc__ = """
+Describes how one raw sheet field is extracted.
+
+header (str): The raw sheet header the value is stored under.
+direction (str): One of CELL, RIGHT, BELOW, PARTICIPANTS, VESSELS or DERIVED.
+anchor: The cell reference (CELL), the anchor label (RIGHT, BELOW, VESSELS)
+    or the participant types in output order (PARTICIPANTS).
+transform (callable): Applied to the found value; for DERIVED fields it
+    is called with the values of depends_on.
+depends_on (tuple): Headers of the fields a DERIVED field is computed from.
+
+Participants are collected from the rows read for the other specs (the
+participant block precedes the vessel block in the service sheets), or
+from the whole sheet when the plan has no other sheet fields.
+"""
+
+
+class _Sweep:
+    """
+    State of one pass over the rows of a sheet: the anchors still
+    pending and the values found so far, kept per direction.
+    """
+
+    def __init__(self, plan):
+        self.pending_right = set(plan.right_anchors)
+        self.pending_below = set(plan.below_anchors)
+        self.pending_vessels = set(plan.vessel_anchors)
+        self.right = {}
+        self.below = {}
+        self.vessels = {}
+        self.participants = {participant_type: [] for participant_type in plan.participant_types}
+        self.active_vessels = None
+        # Last row a CELL or BELOW value is read from
+        self.last_needed_row = max((row for row, _ in plan.cells.values()), default=0)
+        self.bounded = bool(plan.right_anchors or plan.below_anchors or plan.vessel_anchors or plan.cells)
+
+    def feed(self, row_num, values):
+        label_index = LABEL_COLUMN - 1
+        label = values[label_index] if len(values) > label_index else None
+        value = values[label_index + 1] if len(values) > label_index + 1 else None
+
+        if self.active_vessels is not None:
+            # Inside a vessel block, which ends at the first empty name
+            if label is None:
+                self.active_vessels = None
+            else:
+                operator = values[OPERATOR_COLUMN - 1] if len(values) >= OPERATOR_COLUMN else None
+                self.active_vessels.append(VesselRow(label, operator))
+        elif label in self.pending_vessels:
+            self.pending_vessels.discard(label)
+            self.active_vessels = self.vessels[label] = []
+
+        if label in self.pending_right:
+            self.pending_right.discard(label)
+            self.right[label] = value
+
+        if label is not None and value in self.participants:
+            self.participants[value].append(label)
+
+        if self.pending_below and row_num >= BELOW_MIN_ROW:
+            for column_num in range(label_index, len(values)):
+                if values[column_num] in self.pending_below:
+                    self.pending_below.discard(values[column_num])
+                    self.below[values[column_num]] = (row_num + 1, column_num + 1)
+                    self.last_needed_row = max(self.last_needed_row, row_num + 1)
+
+    def is_complete(self, row_num):
+        """
+        Whether every anchor is resolved and every row holding a value has been read.
+        """
+        return (self.bounded and not self.pending_right and not self.pending_below and not self.pending_vessels
+                and self.active_vessels is None and row_num >= self.last_needed_row)
+
+
+class ExtractionPlan:
+    """
+    Evaluates a list of field specs against a ServiceDocument with a
+    single pass over its rows.
+
+    The sheet fields are extracted first, then the DERIVED fields in
+    spec order, so a derived field may depend on any sheet field and on
+    the derived fields listed before it.
+    """
+
+    def __init__(self, field_specs):
+        self.field_specs = list(field_specs)
+        self.right_anchors = {spec.anchor for spec in self.field_specs if spec.direction == RIGHT}
+        self.below_anchors = {spec.anchor for spec in self.field_specs if spec.direction == BELOW}
+        self.vessel_anchors = {spec.anchor for spec in self.field_specs if spec.direction == VESSELS}
+        self.participant_types = {participant_type for spec in self.field_specs if spec.direction == PARTICIPANTS
+                                  for participant_type in spec.anchor}
+        self.cells = {spec.anchor: coordinate_to_tuple(spec.anchor) for spec in self.field_specs
+                      if spec.direction == CELL}
+
+        self.sheet_specs = [spec for spec in self.field_specs if spec.direction != DERIVED]
+        self.derived_specs = [spec for spec in self.field_specs if spec.direction == DERIVED]
+
+        headers = {spec.header for spec in self.sheet_specs}
+        for spec in self.derived_specs:
+            missing = [header for header in spec.depends_on if header not in headers]
+            if missing:
+                raise ValueError(f"{spec.header} depends on fields not defined before it: {', '.join(missing)}")
+            headers.add(spec.header)
+
+    @property
+    def max_column(self):
+        """
+        The last column any spec reads, or None when BELOW anchors
+        (which may sit in any column) require whole rows.
+        """
+        if self.below_anchors:
+            return None
+        columns = [column for _, column in self.cells.values()]
+        if self.right_anchors or self.participant_types:
+            columns.append(VALUE_COLUMN)
+        if self.vessel_anchors:
+            columns.append(OPERATOR_COLUMN)
+        return max(columns, default=None)
+
+    def read_rows(self, sheet_rows):
+        """
+        Collects the rows of a sheet the plan needs: rows are cut to
+        max_column and reading stops once every anchor is resolved, so
+        the rest of a large sheet is never materialized. Sheets missing
+        an anchor are read to the end.
+
+        Parameters:
+        sheet_rows (iterable): Row value sequences of the sheet, starting at row 1.
+
+        Returns:
+        list: Row tuples of cell values.
+        """
+        max_column = self.max_column
+        sweep = _Sweep(self)
+        rows = []
+        for values in sheet_rows:
+            values = tuple(values[:max_column])
+            rows.append(values)
+            sweep.feed(len(rows), values)
+            if sweep.is_complete(len(rows)):
+                break
+        return rows
+
+    def sweep(self, service_document):
+        """
+        Finds every anchor of the plan in one pass over the rows.
+
+        Returns:
+        _Sweep: The found values, kept separately per direction.
+        """
+        sweep = _Sweep(self)
+        for row_num, values in enumerate(service_document.rows, start=1):
+            sweep.feed(row_num, values)
+        return sweep
+
+    def evaluate(self, service_document, file_recorder=None):
+        """
+        Returns the value of every field of the plan.
+
+        Parameters:
+        service_document (ServiceDocument): The service sheet.
+        file_recorder (Instrumentation): Times the sweep and each field's
+        lookup and transform; optional.
+
+        Returns:
+        dict: Header -> extracted value.
+        """
+        if file_recorder is None:
+            from instrumentation import Instrumentation
+            file_recorder = Instrumentation()
+
+        with file_recorder.field("sweep"):
+            found = self.sweep(service_document)
+
+        fields = {}
+        for spec in self.sheet_specs:
+            with file_recorder.field(spec.header):
+                if spec.direction == CELL:
+                    value = service_document.cell_value(*self.cells[spec.anchor])
+                elif spec.direction == RIGHT:
+                    value = found.right.get(spec.anchor)
+                elif spec.direction == BELOW:
+                    position = found.below.get(spec.anchor)
+                    value = service_document.cell_value(*position) if position else None
+                elif spec.direction == VESSELS:
+                    value = found.vessels.get(spec.anchor, [])
+                elif spec.direction == PARTICIPANTS:
+                    value = {participant_type: found.participants[participant_type] for participant_type in spec.anchor}
+                else:
+                    raise ValueError(f"Unknown direction for {spec.header}: {spec.direction}")
+                fields[spec.header] = spec.transform(value) if spec.transform else value
+
+        for spec in self.derived_specs:
+            with file_recorder.field(spec.header):
+                fields[spec.header] = spec.transform(*(fields[header] for header in spec.depends_on))
+        return fields
@@ -0,0 +1,136 @@
+import json
+import time
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    """
+    Collects per-stage and per-field durations and workbook load
+    counts for a pipeline run.
+
+    A disabled instance records nothing, so the timing hooks can stay
+    in place at no cost when no report was asked for.
+
+    Attributes:
+    enabled (bool): Whether measurements are recorded.
+    stages (dict): Stage name -> {"count", "total_s"}.
+    fields (dict): Field name -> {"count", "total_s"}.
+    files (dict): File name -> {"extract_s", "workbook_loads"}.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.fields = {}
+        self.files = {}
+
+    @staticmethod
+    def _add_duration(timings, name, duration):
+        timing = timings.setdefault(name, {"count": 0, "total_s": 0.0})
+        timing["count"] += 1
+        timing["total_s"] += duration
+
+    def _file_entry(self, file_name):
+        return self.files.setdefault(file_name, {"extract_s": 0.0, "workbook_loads": 0})
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as a pipeline stage.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_duration(self.stages, name, time.perf_counter() - start)
+
+    @contextmanager
+    def field(self, name):
+        """
+        Times the enclosed block as the extraction of a raw sheet field.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_duration(self.fields, name, time.perf_counter() - start)
+
+    @contextmanager
+    def file(self, file_name):
+        """
+        Times the extraction of a whole service file.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._file_entry(file_name)["extract_s"] += time.perf_counter() - start
+
+    def count_workbook_load(self, file_name):
+        if self.enabled:
+            self._file_entry(file_name)["workbook_loads"] += 1
+
+    def snapshot(self):
+        """
+        Returns the recorded measurements as a plain dict
+        (e.g. to send them back from a worker process).
+        """
+        return {"stages": self.stages, "fields": self.fields, "files": self.files}
+
+    def merge(self, snapshot):
+        """
+        Adds the measurements of a snapshot taken by another instance.
+        """
+        if not self.enabled or not snapshot:
+            return
+        for own, other in ((self.stages, snapshot["stages"]), (self.fields, snapshot["fields"])):
+            for name, timing in other.items():
+                merged = own.setdefault(name, {"count": 0, "total_s": 0.0})
+                merged["count"] += timing["count"]
+                merged["total_s"] += timing["total_s"]
+        for file_name, entry in snapshot["files"].items():
+            merged = self._file_entry(file_name)
+            merged["extract_s"] += entry["extract_s"]
+            merged["workbook_loads"] += entry["workbook_loads"]
+
+    def reset(self):
+        self.stages = {}
+        self.fields = {}
+        self.files = {}
+
+    def report(self):
+        """
+        Returns the structured run report.
+        """
+        def rounded(timings):
+            return {name: {"count": timing["count"], "total_s": round(timing["total_s"], 6)}
+                    for name, timing in timings.items()}
+
+        return {
+            "stages": rounded(self.stages),
+            "fields": rounded(self.fields),
+            "files": {file_name: {"extract_s": round(entry["extract_s"], 6),
+                                  "workbook_loads": entry["workbook_loads"]}
+                      for file_name, entry in self.files.items()},
+            "totals": {
+                "files": len(self.files),
+                "workbook_loads": sum(entry["workbook_loads"] for entry in self.files.values()),
+            },
+        }
+
+    def write_report(self, report_path):
+        with open(report_path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+
+# Recorder shared by the pipeline modules; enabled by auto_so.main when a report is requested
+recorder = Instrumentation()
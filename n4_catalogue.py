@@ -0,0 +1,205 @@
+import os
+import pickle
+import re
+from collections import Counter, namedtuple
+
+from instrumentation import recorder
+
+N4_SERVICES_FILE_PATH = "n4_svcs.xlsx"
+# Bump when the index layout changes so cached indexes are rebuilt
+CATALOGUE_VERSION = 1
+
+# Minimum similarity for an approximate match to be proposed
+MIN_FUZZY_SCORE = 0.5
+
+NON_ALPHANUMERIC_PATTERN = re.compile(r"[^0-9A-Z]+")
+NAME_ALIAS_PATTERN = re.compile(r"[0-9A-Za-z]+")
+WORD_PATTERN = re.compile(r"[A-Za-z]+")
+
+# How a service name was matched to an N4 code. Only exact and
+# normalized matches are safe to use without a manual check.
+EXACT = "exact"
+NORMALIZED = "normalized"
+ALIAS = "alias"
+ACRONYM = "acronym"
+FUZZY = "fuzzy"
+CONFIDENT_METHODS = (EXACT, NORMALIZED)
+
+N4Match = namedtuple("N4Match", ["code", "score", "method"])
+NO_MATCH = N4Match(None, 0.0, None)
+
+
+def normalize(value):
+    """
+    Returns the upper-case alphanumeric form of a service code or name,
+    e.g. "cnp 2" -> "CNP2", "TCX " -> "TCX".
+    """
+    return NON_ALPHANUMERIC_PATTERN.sub("", str(value).upper())
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+def acronym(value):
+    """
+    Returns the initials of the words of a name,
+    e.g. "India East Coast Express" -> "IECE".
+    """
+    return "".join(word[0] for word in WORD_PATTERN.findall(str(value))).upper()
+
+
+class N4Catalogue:
+    """
+    Lookup index over the N4 service list (n4_svcs.xlsx).
+
+    Service names are matched against the N4 codes (column A) exactly,
+    after normalization, and approximately: against aliases taken from
+    the first word of each N4 service name (column B, e.g. "CNP2" for
+    CN2), by acronym, and by trigram similarity. Lookups are dictionary
+    hits plus a scan of the trigram posting lists, so they stay well
+    under a millisecond for large catalogues.
+
+    The built index is pickled next to the extraction cache and reused
+    until the modification time of n4_svcs.xlsx changes.
+    """
+
+    def __init__(self, entries):
+        """
+        Parameters:
+        entries (list): (code, name) tuples in catalogue order.
+        """
+        self.codes = set()
+        self.normalized_codes = {}
+        self.aliases = {}
+        self.trigram_index = {}
+        self.key_trigram_counts = {}
+        self.key_codes = {}
+
+        for code, name in entries:
+            self.codes.add(code)
+            normalized_code = normalize(code)
+            if not normalized_code:
+                continue
+            self.normalized_codes.setdefault(normalized_code, code)
+            self._index_key(normalized_code, code)
+
+            alias_match = NAME_ALIAS_PATTERN.search(str(name or ""))
+            if alias_match:
+                alias = normalize(alias_match.group())
+                if alias not in self.normalized_codes:
+                    self.aliases.setdefault(alias, code)
+                    self._index_key(alias, code)
+
+    def _index_key(self, key, code):
+        if key in self.key_trigram_counts:
+            return
+        key_trigrams = trigrams(key)
+        self.key_trigram_counts[key] = len(key_trigrams)
+        self.key_codes[key] = code
+        for trigram in key_trigrams:
+            self.trigram_index.setdefault(trigram, []).append(key)
+
+    @classmethod
+    def from_xlsx(cls, file_path=N4_SERVICES_FILE_PATH):
+        """
+        Builds the catalogue from columns A (code) and B (name) of the
+        N4 service list, up to the first empty code.
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        sheet = workbook.active
+        entries = []
+        for code, name in sheet.iter_rows(min_col=1, max_col=2, values_only=True):
+            if code is None:
+                break
+            entries.append((code, name))
+        workbook.close()
+        recorder.count_workbook_load(os.path.basename(file_path))
+        return cls(entries)
+
+    @classmethod
+    def load(cls, file_path=N4_SERVICES_FILE_PATH, cache_dir=None):
+        """
+        Returns the catalogue of an N4 service list, reusing the cached
+        index in cache_dir while the file's modification time is unchanged.
+        """
+        if cache_dir is None:
+            return cls.from_xlsx(file_path)
+
+        source_mtime = os.stat(file_path).st_mtime_ns
+        cache_path = os.path.join(cache_dir, f"n4_catalogue_v{CATALOGUE_VERSION}.pkl")
+        try:
+            with open(cache_path, "rb") as file:
+                cached_mtime, cached_path, catalogue = pickle.load(file)
+            if cached_mtime == source_mtime and cached_path == os.path.abspath(file_path):
+                return catalogue
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+
+        catalogue = cls.from_xlsx(file_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump((source_mtime, os.path.abspath(file_path), catalogue), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+        return catalogue
+
+    def __contains__(self, service_name):
+        return service_name in self.codes
+
+    def fuzzy_match(self, key):
+        """
+        Returns the code whose code or alias is most similar to the
+        normalized key (Dice coefficient over trigrams).
+        """
+        key_trigrams = trigrams(key)
+        shared_counts = Counter()
+        for trigram in key_trigrams:
+            shared_counts.update(self.trigram_index.get(trigram, ()))
+
+        # A candidate sharing fewer than a third of the key's trigrams
+        # cannot reach MIN_FUZZY_SCORE, whatever its length
+        min_shared = len(key_trigrams) * MIN_FUZZY_SCORE / (2 - MIN_FUZZY_SCORE)
+        best = NO_MATCH
+        for candidate, shared in shared_counts.items():
+            if shared < min_shared:
+                continue
+            score = 2 * shared / (len(key_trigrams) + self.key_trigram_counts[candidate])
+            if score > best.score:
+                best = N4Match(self.key_codes[candidate], score, FUZZY)
+        return best
+
+    def match(self, service_name):
+        """
+        Returns the best N4 code for a service name.
+
+        Returns:
+        N4Match: The code, a score between 0 and 1 and the match method
+        (NO_MATCH when nothing comes close).
+        """
+        if service_name in self.codes:
+            return N4Match(service_name, 1.0, EXACT)
+
+        key = normalize(service_name)
+        if not key:
+            return NO_MATCH
+        if key in self.normalized_codes:
+            return N4Match(self.normalized_codes[key], 1.0, NORMALIZED)
+
+        # Shared services are often listed as "JSX / JPX"
+        for part in str(service_name).split("/"):
+            part_key = normalize(part)
+            if part_key in self.normalized_codes:
+                return N4Match(self.normalized_codes[part_key], 0.9, ALIAS)
+            if part_key in self.aliases:
+                return N4Match(self.aliases[part_key], 0.9, ALIAS)
+
+        initials = acronym(service_name)
+        if len(initials) > 1:
+            for candidate in (initials, initials[:3]):
+                if candidate in self.normalized_codes:
+                    return N4Match(self.normalized_codes[candidate], 0.8, ACRONYM)
+
+        best = self.fuzzy_match(key)
+        return best if best.score >= MIN_FUZZY_SCORE else NO_MATCH
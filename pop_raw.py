@@ -1,394 +1,493 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from instrumentation import Instrumentation, recorder
+from excel_manip import SheetWriter, get_sheet_dimensions, get_cell_reference, remove_pivot_table_sheets
+from service_cache import ServiceRowCache, file_content_hash
+from n4_catalogue import CONFIDENT_METHODS, N4_SERVICES_FILE_PATH, N4Catalogue
+from prepared_template import RAW_DATA_SHEET_NAME, prepare_workbook, prepared_template_path
+from extraction_plan import BELOW, CELL, DERIVED, PARTICIPANTS, RIGHT, VESSELS, ExtractionPlan, FieldSpec
+from records import RAW_HEADERS, ServiceRecord
+from service_document import ServiceDocument
+from summaries import SummaryAggregator, write_summary_sheets
+from vessel_index import VESSEL_INDEX_FILE_NAME, VesselIndex
+from service_text import parse_lead_sl, parse_port, parse_service_name, parse_vessel_count, parse_vessel_size
+
+# Bump whenever the extracted rows change so cached records are re-extracted
+EXTRACTOR_VERSION = 2
+
+# Participant types listed in PARTICIPANTS, in output order
+participant_types = ["Vessel provider", "Slotter"]
+
+def format_participants_list(participants_by_type):
+    formatted_participants_list = ""
+    for participant_type, participant_list_by_type in participants_by_type.items():
+        if participant_list_by_type:
+            delimited_string = " / ".join(participant_list_by_type)
+            cleaned_string = f"{participant_type}s: {delimited_string}"
+            if participant_type == "Slotter":
+                formatted_participants_list += " / "
+            formatted_participants_list += cleaned_string
+    return formatted_participants_list
+
+# Field list: how each extracted column is found in the service sheet
+# (see extraction_plan.py). None marks columns filled in by ServiceRecord.rows.
+raw_cells_to_extract = {
+    "SERVICE NAME": FieldSpec("SERVICE NAME", DERIVED, transform=parse_service_name, depends_on=("SERVICE DESC",)),
+    "SERVICE DESC": FieldSpec("SERVICE DESC", CELL, "D3"),
+    "ROUTE": FieldSpec("ROUTE", RIGHT, "Coverage"),
+    "LEAD SL": FieldSpec("LEAD SL", DERIVED, transform=parse_lead_sl, depends_on=("SERVICE DESC",)),
+    "SAILING FREQ": FieldSpec("SAILING FREQ", RIGHT, "Sailing frequency"),
+    "PARTICIPANTS": FieldSpec("PARTICIPANTS", PARTICIPANTS, participant_types, transform=format_participants_list),
+    "VESSEL OPERATOR":None,
+    "# OF VESSELS": FieldSpec("# OF VESSELS", DERIVED, transform=parse_vessel_count, depends_on=("SHIPS USED",)),
+    "# OF VESSELS PER ROW COUNT": None,
+    "WEEKLY CAPACITY": FieldSpec("WEEKLY CAPACITY", RIGHT, "Weekly capacity (teu)"),
+    "SHIPS USED": FieldSpec("SHIPS USED", RIGHT, "Proforma fleet"),
+    "PORT ROTATION": FieldSpec("PORT ROTATION", BELOW, "Port rotation"),
+    "VESSEL SIZE": FieldSpec("VESSEL SIZE", DERIVED, transform=parse_vessel_size, depends_on=("SHIPS USED",)),
+    "VESSEL NAME": FieldSpec("VESSEL NAME", VESSELS, "Vessel name"),
+    }
+
+# PORT is read from the "Manila called at" line of the Comments section
+port_field = FieldSpec("PORT", BELOW, "Comments", transform=parse_port)
+
+# All fields are located in a single sweep over the service sheet
+extraction_plan = ExtractionPlan([port_field] + [field for field in raw_cells_to_extract.values() if field is not None])
+
+
+def get_mict_service_name(service_record, n4_catalogue):
+    """
+    Returns the MICT SERVICE NAME of a service: its N4 code when the
+    service calls MICT and the name matches an N4 code (exactly or
+    after normalization), "MANUAL CHECK" when it does not, and the
+    service name for other ports.
+    """
+    service_name = service_record.service_name
+    port = service_record.port
+
+    if "MICT" in port:
+        n4_match = n4_catalogue.match(service_name)
+        if n4_match.method in CONFIDENT_METHODS:
+            return n4_match.code
+        else:
+            return "MANUAL CHECK"
+    elif "MICT" not in port:
+        return service_name
+
+def suggest_n4_service_code(service_record, n4_catalogue):
+    """
+    Returns the closest N4 match of a service marked "MANUAL CHECK".
+
+    Returns:
+    N4Match: The code (None when nothing comes close), score and method.
+    """
+    return n4_catalogue.match(service_record.service_name)
+
+def extract_service_record(service_file_path, file_recorder=None):
+    """
+    Extracts the "raw" sheet fields of a single service file.
+    The record yields one row per vessel entry.
+
+    MICT SERVICE NAME is left empty; it depends on the N4 service
+    list and is filled in by populate_raw_data_sheet.
+
+    Parameters:
+    service_file_path (str): Relative path to the service file.
+    file_recorder (Instrumentation): Records per-field durations; optional.
+
+    Returns:
+    ServiceRecord: The service fields and its vessels.
+    """
+    if file_recorder is None:
+        file_recorder = Instrumentation()
+    service_file = os.path.basename(service_file_path)
+
+    with file_recorder.field("load"):
+        service_document = ServiceDocument.from_file(service_file_path, extraction_plan)
+        file_recorder.count_workbook_load(service_file)
+
+    # Every field of the plan is located in one sweep over the sheet;
+    # the sweep and each field's transform are timed separately
+    fields = extraction_plan.evaluate(service_document, file_recorder)
+
+    row_data = ServiceRecord()
+    for header, value in fields.items():
+        if header == "VESSEL NAME":
+            # VESSEL NAME, VESSEL OPERATOR
+            # If no vessels are listed the record yields a single "-" row
+            row_data.vessels = value
+        else:
+            row_data[header] = value
+
+    return row_data
+
+def extract_service_record_safely(service_file_path, instrument=False):
+    """
+    Runs extract_service_record, returning the error instead of
+    raising so a single bad file does not abort the whole batch.
+
+    Parameters:
+    service_file_path (str): Relative path to the service file.
+    instrument (bool): Whether to time the extraction.
+
+    Returns:
+    tuple: (ServiceRecord or None, error message or None, measurements or None)
+    """
+    file_recorder = Instrumentation(enabled=instrument)
+    try:
+        with file_recorder.file(os.path.basename(service_file_path)):
+            service_record = extract_service_record(service_file_path, file_recorder)
+        error = None
+    except Exception as e:
+        service_record, error = None, f"{type(e).__name__}: {e}"
+    return service_record, error, file_recorder.snapshot() if instrument else None
+
+def extract_all_service_records(service_file_paths, workers=1, executor=None):
+    """
+    Extracts the record of every service file, optionally fanning the
+    work out over a process pool.
+
+    Results are yielded in the order of service_file_paths regardless
+    of the order in which the workers finish. Measurements taken in
+    the workers are merged into the shared recorder.
+
+    Parameters:
+    service_file_paths (list): Paths of the service files.
+    workers (int): Number of worker processes; 1 extracts in-process.
+    executor (ProcessPoolExecutor): Existing pool to extract with instead of
+    starting one for these files; optional.
+
+    Yields:
+    tuple: (ServiceRecord or None, error message or None), one per service file.
+    """
+    extract = partial(extract_service_record_safely, instrument=recorder.enabled)
 
-from excel_manip import extract_cell, create_table, get_sheet_dimensions, get_cell_reference
-from openpyxl import load_workbook
-from openpyxl.workbook import Workbook
+    if executor is None and workers is not None and workers > 1 and len(service_file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from extract_all_service_records(service_file_paths, executor=executor)
+        return
+
+    results = executor.map(extract, service_file_paths) if executor is not None else map(extract, service_file_paths)
+    for service_record, error, measurements in results:
+        recorder.merge(measurements)
+        yield service_record, error
+
+def load_service_records(service_files, input_dir, workers=1, cache_dir=None, chunk_size=None):
+    """
+    Yields the extracted record of every service file, serving unchanged
+    files from the on-disk cache and extracting only new or modified ones.
+
+    With chunk_size, the files are looked up and extracted chunk_size at
+    a time, so no more than one chunk of records is held in memory. The
+    chunks share a single process pool.
 
-def populate_raw_data_sheet(file_path, service_files, input_dir):
+    Parameters:
+    service_files (list): List of service file names.
+    input_dir (str): The name of the directory containing the input files.
+    workers (int): Number of processes used to extract the service files.
+    cache_dir (str): Directory of the extracted rows cache; None disables caching.
+    chunk_size (int): Number of service files processed at a time; None processes them all at once.
+
+    Yields:
+    tuple: (service file name, ServiceRecord or None, error message or None), in the order of service_files.
+
+    Raises:
+    ValueError: If chunk_size is less than 1.
     """
-    Creates and populates the "raw" sheet with data from the service files.
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"The chunk size must be at least 1, not {chunk_size}")
+    chunk_size = chunk_size or max(len(service_files), 1)
+    cache = ServiceRowCache(cache_dir, EXTRACTOR_VERSION) if cache_dir is not None else None
+    # Started once and reused by every chunk; its processes are only spawned when files are submitted
+    executor = ProcessPoolExecutor(max_workers=workers) if workers is not None and workers > 1 else None
+    miss_count = 0
+    try:
+        for chunk_start in range(0, len(service_files), chunk_size):
+            chunk_files = service_files[chunk_start:chunk_start + chunk_size]
+            miss_count += yield from _load_service_records_chunk(chunk_files, input_dir, executor, cache)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if cache is None:
+        return
+    with recorder.stage("cache_save"):
+        cache.evict_missing(service_files)
+        cache.save()
+    print(f"Extracted {miss_count} of {len(service_files)} service files ({len(service_files) - miss_count} from cache)")
+
+def _load_service_records_chunk(service_files, input_dir, executor, cache):
+    # Yields the records of service_files and returns the number of files extracted
+    service_file_paths = [os.path.join(input_dir, service_file) for service_file in service_files]
+    if cache is None:
+        extracted = extract_all_service_records(service_file_paths, executor=executor)
+        for service_file, (service_record, error) in zip(service_files, extracted):
+            yield service_file, service_record, error
+        return len(service_files)
+
+    cached_records = {}
+    file_hashes = {}
+    misses = []
+
+    with recorder.stage("cache_lookup"):
+        for service_file, service_file_path in zip(service_files, service_file_paths):
+            file_hash = file_content_hash(service_file_path)
+            service_record = cache.get(service_file, file_hash)
+            if service_record is not None:
+                cached_records[service_file] = service_record
+            else:
+                file_hashes[service_file] = file_hash
+                misses.append(service_file_path)
+
+    # Cached and freshly extracted records are interleaved back into input order
+    extracted = extract_all_service_records(misses, executor=executor)
+    for service_file in service_files:
+        if service_file in cached_records:
+            yield service_file, cached_records.pop(service_file), None
+            continue
+
+        service_record, error = next(extracted)
+        if error is None:
+            cache.put(service_file, file_hashes[service_file], service_record)
+        yield service_file, service_record, error
+    return len(misses)
+
+def populate_raw_data_sheet(template_file_path, file_path, service_files, input_dir, workers=1, cache_dir=None,
+                            n4_services_file_path=N4_SERVICES_FILE_PATH, sinks=(), static_summaries=False,
+                            shard_by=None, chunk_size=None):
+    """
+    Creates the output workbook from the template and populates its
+    "raw" sheet with data from the service files.
     Population of data is by row/vessel entry.
 
     Parameters:
+    template_file_path (str): The path of the template workbook.
     file_path (str): The path of the output file.
     service_files (list): List of service file names; datasource
-    raw_cells_to_extract (dict): Map of column headers to extract with cell references of the data.
     input_dir (str): The name of the directory containing the input files
+    workers (int): Number of processes used to extract the service files and to write the shards.
+    cache_dir (str): Directory of the extracted rows cache; None disables caching.
+    n4_services_file_path (str): The path of the N4 service list.
+    sinks (list): Additional outputs (see sinks.py) receiving the same rows.
+    static_summaries (bool): Write the summary sheets (see summaries.py) in place of
+    the pivot table sheets.
+    shard_by (str): Also write one workbook per value of this raw sheet column,
+    e.g. "PORT" (see shards.py).
+    chunk_size (int): Extract the service files chunk_size at a time and spill the
+    rows to disk, so memory does not grow with the number of files (see spill.py).
+
+    Returns:
+    Workbook: The saved output workbook.
+    """
+    if shard_by and chunk_size:
+        raise ValueError("Sharded output cannot be combined with chunked mode")
+
+    with recorder.stage("load_n4_services"):
+        n4_catalogue = N4Catalogue.load(n4_services_file_path, cache_dir)
+    service_records = load_service_records(service_files, input_dir, workers, cache_dir, chunk_size)
+    if shard_by:
+        from shards import write_sharded_overviews
 
+        return write_sharded_overviews(template_file_path, file_path, service_records, n4_catalogue, shard_by, sinks,
+                                       cache_dir, static_summaries, workers)
+    return write_raw_data_sheet(template_file_path, file_path, service_records, n4_catalogue, sinks, cache_dir,
+                                static_summaries, spill_rows=bool(chunk_size))
 
+def raw_data_rows(service_records, n4_catalogue, failed_files):
     """
+    Yields the raw sheet rows of each service record in input order,
+    after setting its MICT SERVICE NAME and ALT SRVC CD.
 
-    def find_cell_value_to_right(service_file_path, search_string):
-        """
-        Finds the specified search string and returns the value to the right.
-        """
-        try:
-            workbook = load_workbook(service_file_path)
-            sheet = workbook.active
-
-            for row in sheet.iter_rows(values_only=True):
-                if row[2] == search_string:  # Column C is index 2 (0-based index)
-                    # Return value from column D (index 3)
-                    return row[3]
-            
-            # If the search_string is not found, return None
-            return None
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
-    
-    def find_cell_value_to_below(service_file_path, search_string):
-        workbook = load_workbook(service_file_path)
-        sheet = workbook.active
-
-        for row in sheet.iter_rows(min_row=25, min_col=3):
-            for cell in row:
-                if cell.value == search_string:
-                    row_index = cell.row
-                    column_index = cell.column
-                    value_below = sheet.cell(row=row_index+1, column=column_index).value
-                    return value_below
-
-        return None  # Keyword not found or cell below is empty
-
-    def list_vesselnames_cell_references(service_file_path):
-        """
-        Given an Excel file, return a list of all 
-        cell references of the vessel names.
-
-        Parameters:
-        service_file_path (str): Relative path to the .xlsx input file.
-        """
-        workbook = load_workbook(service_file_path)
-        sheet = workbook.active
-        start_extraction = False
-        extracted_cells = []
-
-        for row_num, row in enumerate(sheet.iter_rows(min_row=1, min_col=3, max_col=3, values_only=True), start=1):
-            cell_value = row[0]
-            if start_extraction:
-                if cell_value is None:
-                    break
-                extracted_cells.append(f"C{row_num}")
-            elif cell_value == "Vessel name":
-                start_extraction = True
-
-        return extracted_cells
-
-    
-    # Field list
-    raw_cells_to_extract = {
-        "SERVICE NAME": None,
-        "SERVICE DESC": "D3",
-        "ROUTE": None,
-        "LEAD SL": None,
-        "SAILING FREQ": None,
-        "PARTICIPANTS": None,
-        "VESSEL OPERATOR":None,
-        "# OF VESSELS": None,
-        "# OF VESSELS PER ROW COUNT": None,
-        "WEEKLY CAPACITY":None,
-        "SHIPS USED": None,
-        "PORT ROTATION": None,
-        "VESSEL SIZE": None,
-        "VESSEL NAME": None
-        }
-    raw_headers_internal = [
-        "PORT",
-        "MICT SERVICE NAME",
-        "ALT SRVC CD"
-        ]
-    
-    raw_headers_extract = [cell for cell in raw_cells_to_extract.keys()]
-    raw_headers_list = list(raw_headers_internal[:2]) + list(raw_headers_extract[:12]) + [raw_headers_internal[2]] + list(raw_headers_extract[12:])
-    # Create sheet and populate header
-    workbook = load_workbook(file_path)
-    raw_data_sheet_name = "raw"
+    Files that could not be extracted are reported and appended to
+    failed_files; a summary is printed once the records are exhausted.
 
-    try:
-        sheet_names = workbook.sheetnames
-        del workbook[raw_data_sheet_name]
-        workbook.create_sheet(raw_data_sheet_name)
-    except KeyError:
+    Parameters:
+    service_records (iterable): (service file name, ServiceRecord or None, error message or None) tuples.
+    n4_catalogue (N4Catalogue): Index of the N4 service list.
+    failed_files (list): Receives the names of the files that could not be extracted.
+
+    Yields:
+    tuple: One raw sheet row in RAW_HEADERS order.
+    """
+    service_count = 0
+    for service_file, service_record, error in service_records:
+        service_count += 1
+        if error is not None:
+            print(f"Error: {service_file}: {error}")
+            failed_files.append(service_file)
+            continue
+
+        # MICT SERVICE NAME
+        service_record.mict_service_name = get_mict_service_name(service_record, n4_catalogue)
+        # ALT SRVC CD proposes the closest N4 code for manual checks; the
+        # score stays out of the sheet, where ALT SRVC CD is a pivot field
+        n4_match = None
+        if service_record.mict_service_name == "MANUAL CHECK":
+            n4_match = suggest_n4_service_code(service_record, n4_catalogue)
+            service_record.alt_srvc_cd = n4_match.code
+        yield from service_record.rows()
+        print(service_record.service_name)
+        if n4_match is not None and n4_match.code is not None:
+            print(f"  MANUAL CHECK: closest N4 code {n4_match.code} ({n4_match.method}, score {n4_match.score:.2f})")
+
+    if failed_files:
+        print(f"{len(failed_files)} of {service_count} service files could not be extracted: {', '.join(failed_files)}")
+
+def write_raw_data_sheet(template_file_path, file_path, service_records, n4_catalogue=None, sinks=(),
+                         cache_dir=None, static_summaries=False, index_vessels=True, spill_rows=False):
+    """
+    Writes extracted service records to the "raw" sheet of a copy of the template.
+
+    The template is loaded once with the "raw" sheet emptied and pivot
+    tables set to refresh on load (see prepared_template.py), rows are
+    appended as they are produced and the column widths tracked by the
+    SheetWriter are applied before the single save. Every row is also
+    written to the sinks, and to the vessel index (see vessel_index.py)
+    saved in cache_dir unless index_vessels is False. The sinks are
+    closed only once the workbook is saved; if any step fails, they are
+    aborted and keep their previous output.
+
+    With spill_rows, the rows are kept on disk instead of in the sheet
+    and streamed into the saved file (see spill.py); the returned
+    workbook then holds the header row of the "raw" sheet only.
+
+    With static_summaries, the rows are also totalled into summary
+    sheets while they are appended, and the pivot table sheets are
+    removed: their caches still hold the template's records, so kept
+    without a refresh on load they would show stale totals.
+
+    Parameters:
+    template_file_path (str): The path of the template workbook.
+    file_path (str): The path of the output file.
+    service_records (iterable): (service file name, ServiceRecord or None, error message or None) tuples.
+    n4_catalogue (N4Catalogue): Index of the N4 service list; loaded from n4_svcs.xlsx when None.
+    sinks (list): Additional outputs (see sinks.py) receiving the same rows.
+    cache_dir (str): Directory of the pipeline cache holding the prepared
+    template; None prepares the template in memory.
+    static_summaries (bool): Write the summary sheets in place of the pivot table sheets.
+    index_vessels (bool): Save the vessel index of the rows in cache_dir.
+    spill_rows (bool): Keep the rows on disk so memory does not grow with their number.
+
+    Returns:
+    Workbook: The saved output workbook.
+    """
+    from openpyxl import load_workbook
+
+    raw_data_sheet_name = RAW_DATA_SHEET_NAME
+    with recorder.stage("load_template"):
+        if cache_dir is not None:
+            # The template-level changes were made once, in the cached copy
+            prepared_path = prepared_template_path(template_file_path, cache_dir)
+            workbook = load_workbook(prepared_path) if prepared_path else None
+            raw_data_sheet = workbook[raw_data_sheet_name] if workbook else None
+        else:
+            workbook = load_workbook(template_file_path)
+            raw_data_sheet = prepare_workbook(workbook)
+        recorder.count_workbook_load(os.path.basename(template_file_path))
+
+    if raw_data_sheet is None:
         # Handle the case where the sheet doesn't exist
         print(f"The sheet '{raw_data_sheet_name}' doesn't exist.")
         return
-    finally:
-        workbook.save(file_path)
-    
-    workbook = load_workbook(file_path)
-    raw_data_sheet = workbook[raw_data_sheet_name]
-    workbook.active = raw_data_sheet
-    workbook.title = "Service Overview"
-    raw_data_sheet.append(raw_headers_list)
-    raw_data_sheet.freeze_panes = "A2"
-
-    def get_column_values(service_file_path, column):
-        workbook = load_workbook(service_file_path)
-        sheet = workbook.active
-        values_set = set()
-        
-        for cell in sheet[column]:
-            if cell.value is None:
-                break
-            values_set.add(cell.value)
-
-        return values_set
-
-    # Load N4 Services into set
-    n4_svcs = get_column_values("n4_svcs.xlsx", "A")
-
-    def find_port(comment_string):
-        comment_string = comment_string.lower()
-        port_mapping = {
-            "north and south": "MICT + ATI",
-            "north": "MICT",
-            "south": "ATI"
-        }
-
-        for search_string, port in port_mapping.items():
-            if search_string in comment_string:
-                return port
-
-        return "domestic"
-        
-    def extract_text_between_phrases(input_string, start_phrase, end_phrase):
-        """
-        Extracts the text between two given phrases in the input string.
-
-        Parameters:
-        input_string (str): The input string to search within.
-        start_phrase (str): The phrase that marks the start of the desired text.
-        end_phrase (str): The phrase that marks the end of the desired text.
-
-        Returns:
-        str: The extracted text between the start and end phrases, or an empty string if no text is found.
-        """
-        start_index = input_string.find(start_phrase) + len(start_phrase)
-        end_index = input_string.find(end_phrase)
-
-        return input_string[start_index:end_index].strip() if start_index != -1 and end_index != -1 else ""
-
-    def get_service_name(service_desc):
-        if has_parentheses(service_desc):
-            cell_value = get_text_in_last_parentheses(service_desc)
-            if has_dash(cell_value):
-                cell_value = get_text_after_last_dash(cell_value)[:-1]
-        else:
-            cell_value = get_text_after_last_dash(service_desc)
-        return cell_value
-        
-    def get_mict_service_name(n4_svcs):
-        service_name = row_data["SERVICE NAME"]
-        port = row_data["PORT"]
-
-        if "MICT" in port:
-            if service_name in n4_svcs:
-                return service_name
-            else:
-                return "MANUAL CHECK"
-        elif "MICT" not in port:
-            return service_name
-        
-    def strip_lead_sl(service_desc):
-        dashes_list = [" - ", " – ", " — "]
-        for dash in dashes_list:
-            index = service_desc.find(dash)
-            if index != -1:
-                extract = service_desc[:index]
-        delim = " / "
-        if delim in extract:
-            extract = extract.split(delim)[0].strip()
-        return extract
-
-    # Iterate through the .xlsx files and extract cell data
-    for service_file in service_files:
-        service_file_path = os.path.join(input_dir, service_file)
-        row_data = {key: None for key in raw_headers_list}
-        
-        # PORT
-        lookup = "PORT"
-        cell_value = find_cell_value_to_below(service_file_path, "Comments")
-        start_phrase = "Manila called at"
-        end_phrase = "Comments - Service Chronology"
-        sliced_cell_value = extract_text_between_phrases(cell_value, start_phrase, end_phrase)
-        port = find_port(sliced_cell_value)
-        row_data[lookup] = port
-
-        # SERVICE DESC
-        lookup = "SERVICE DESC"
-        cell_reference = raw_cells_to_extract[lookup]
-        cell_value = extract_cell(service_file_path, cell_reference)
-        row_data[lookup] = cell_value
-
-        # SERVICE NAME
-        def has_parentheses(s):
-            return '(' in s and ')' in s
-        
-        def has_dash(s):
-            return '-' in s or "–" in s or "—" in s
-        
-        def get_text_in_last_parentheses(text):
-            last_open = text.rfind("(")
-            last_close = text.rfind(")")
-            if last_open != -1 and last_close > last_open:
-                return text[last_open + 1:last_close]
-            else:
-                return ""
-        
-        def get_text_after_last_dash(text):
-            last_dash_idx = 0
-            idx_temp = 0
-            for char in ["-", "–", "—"]:
-                temp = service_desc.rfind(char)
-                if temp > idx_temp:
-                    last_dash_idx = temp
-            extracted_text = service_desc[last_dash_idx+1:].strip()
-            return extracted_text
-            
-
-        # SERVICE NAME
-        lookup = "SERVICE NAME"
-        service_desc = row_data["SERVICE DESC"]
-        cell_value = get_service_name(service_desc)
-        row_data[lookup] = cell_value
-        print(row_data[lookup])
 
-        # MICT SERVICE NAME
-        lookup = "MICT SERVICE NAME"
-        cell_value = get_mict_service_name(n4_svcs)
-        row_data[lookup] = cell_value
-
-        # ROUTE
-        lookup = "ROUTE"
-        cell_value = find_cell_value_to_right(service_file_path, "Coverage")
-        row_data[lookup] = cell_value
-
-        # LEAD SL
-        lookup = "LEAD SL"
-        cell_value = row_data["SERVICE DESC"]
-        lead_sl = strip_lead_sl(cell_value)
-        row_data[lookup] = lead_sl
-
-        # SAILING FREQ
-        lookup = "SAILING FREQ"
-        cell_value = find_cell_value_to_right(service_file_path, "Sailing frequency")
-        row_data[lookup] = cell_value
-
-        def list_participant_by_type(service_file_path, column, type):
-            workbook = load_workbook(service_file_path)
-            sheet = workbook.active
-            cell_values = []
-
-            for cell in sheet[column]:
-                if cell.value != None:
-                    cell_to_the_right = sheet.cell(row=cell.row, column=cell.column + 1)
-                    if cell_to_the_right.value == type:
-                        cell_values.append(cell.value)
-
-            return cell_values
-        
-        
-        def format_participants_list(service_file_path, column):
-            participant_types = ["Vessel provider", "Slotter"]
-            formatted_participants_list = ""
-            for participant_type in participant_types:
-                participant_list_by_type = list_participant_by_type(service_file_path, column, participant_type)
-                if participant_list_by_type:
-                    delimited_string = " / ".join(participant_list_by_type)
-                    cleaned_string = f"{participant_type}s: {delimited_string}"
-                    if participant_type == "Slotter":
-                        formatted_participants_list += " / "
-                    formatted_participants_list += cleaned_string
-            return formatted_participants_list
-
-        # PARTICIPANTS
-        lookup = "PARTICIPANTS"
-        cell_value = format_participants_list(service_file_path, "C")
-        row_data[lookup] = cell_value
-
-        # WEEKLY CAPACITY
-        lookup = "WEEKLY CAPACITY"
-        cell_value = find_cell_value_to_right(service_file_path, "Weekly capacity (teu)")
-        row_data[lookup] = cell_value
-
-        # SHIPS USED
-        lookup = "SHIPS USED"
-        cell_value = find_cell_value_to_right(service_file_path, "Proforma fleet")
-        row_data[lookup] = cell_value
-
-        def extract_vessel_size(input_string):
-            # Split the input_string at the word "from"
-            parts = input_string.split("from", 1)
-
-            # Check if "from" exists in the input_string
-            if len(parts) > 1:
-                # Extract everything after "from" and remove leading/trailing spaces
-                result = parts[1].strip()
-                return result
+    # The header row is already in the sheet
+    raw_data_writer = SheetWriter(raw_data_sheet)
+    raw_data_writer.track(RAW_HEADERS)
+
+    # Load N4 Services index
+    if n4_catalogue is None:
+        with recorder.stage("load_n4_services"):
+            n4_catalogue = N4Catalogue.load(N4_SERVICES_FILE_PATH)
+
+    row_spill = None
+    if spill_rows:
+        from spill import RowSpill
+
+        # Next to the output rather than in the system temp directory, which may be memory-backed
+        row_spill = RowSpill(os.path.dirname(os.path.abspath(file_path)))
+    failed_files = []
+    summary_aggregator = SummaryAggregator() if static_summaries else None
+    sinks = list(sinks) + ([summary_aggregator] if summary_aggregator else [])
+    if cache_dir is not None and index_vessels:
+        sinks.append(VesselIndex(os.path.join(cache_dir, VESSEL_INDEX_FILE_NAME)))
+
+    # Sinks are only committed once the overview is saved; on any failure,
+    # including a save failure, they keep their previous output
+    try:
+        for sink in sinks:
+            sink.open(RAW_HEADERS)
+
+        # Rows are streamed, so this stage includes waiting on the extraction
+        with recorder.stage("extract_and_append"):
+            for row in raw_data_rows(service_records, n4_catalogue, failed_files):
+                if row_spill is None:
+                    raw_data_writer.append(row)
+                else:
+                    row_spill.write(row)
+                    raw_data_writer.track(row)
+                for sink in sinks:
+                    sink.write(row)
+
+        # # Set raw data as table
+        # sheet_dimensions = get_sheet_dimensions(file_path, raw_data_sheet_name)
+        # start_cell = "A1"
+        # end_cell = f"{get_cell_reference(sheet_dimensions[0], sheet_dimensions[1])}"
+        # cell_range = f"{start_cell}:{end_cell}"
+
+        # Column widths are tracked while the rows are appended
+        raw_data_writer.apply_column_widths()
+
+        if summary_aggregator is not None:
+            with recorder.stage("summaries"):
+                write_summary_sheets(workbook, summary_aggregator)
+                # The pivot caches are not filled, so the pivot sheets would show the template's records
+                removed_sheets = remove_pivot_table_sheets(workbook)
+                if removed_sheets:
+                    print(f"Pivot table sheets replaced by the summary sheets: {', '.join(removed_sheets)}")
+
+        with recorder.stage("save"):
+            if row_spill is None:
+                workbook.save(file_path)
             else:
-                # If "from" is not found, return None
-                return None
-            
-        # VESSEL SIZE
-        lookup = "VESSEL SIZE"
-        try:
-            cell_value = extract_vessel_size(row_data["SHIPS USED"])[:-1]
-        except TypeError:
-            cell_value = "-"
-        row_data[lookup] = cell_value
+                _save_with_spilled_rows(workbook, file_path, raw_data_sheet_name, row_spill)
+    except BaseException:
+        for sink in sinks:
+            sink.abort()
+        raise
+    finally:
+        if row_spill is not None:
+            row_spill.close()
+
+    with recorder.stage("close_sinks"):
+        for sink in sinks:
+            sink.close()
+    return workbook
 
-        # # OF VESSELS
-        lookup = "# OF VESSELS"
+def _save_with_spilled_rows(workbook, file_path, raw_data_sheet_name, row_spill):
+    from spill import stream_rows_into_sheet
+
+    # The workbook is saved without the rows, which are then streamed into its "raw" sheet part
+    header_only_path = f"{row_spill.file_path}.xlsx"
+    try:
+        workbook.save(header_only_path)
+        stream_rows_into_sheet(header_only_path, file_path, raw_data_sheet_name, row_spill.rows(),
+                               row_spill.row_count, len(RAW_HEADERS))
+    finally:
+        if os.path.exists(header_only_path):
+            os.remove(header_only_path)
+
+        from spill import stream_rows_into_sheet
+
+        # The workbook is saved without the rows, which are then streamed into its "raw" sheet part
+        header_only_path = f"{row_spill.file_path}.xlsx"
         try:
-            cell_value = int(row_data["SHIPS USED"].split()[0])
-        except ValueError:
-            cell_value = row_data["SHIPS USED"].split()[0]
-
-        row_data[lookup] = cell_value
-
-        # # OF VESSELS PER ROW COUNT
-        lookup = "# OF VESSELS PER ROW COUNT"
-        cell_value = 1
-        row_data[lookup] = cell_value
-
-        # PORT ROTATION
-        lookup = "PORT ROTATION"
-        cell_value = find_cell_value_to_below(service_file_path, "Port rotation")
-        row_data[lookup] = cell_value
-
-        # WEEKLY CAPACITY
-        lookup = "WEEKLY CAPACITY"
-        cell_value = find_cell_value_to_right(service_file_path, "Weekly capacity (teu)")
-        row_data[lookup] = cell_value
-
-        # VESSEL NAME, VESSEL OPERATOR
-        lookup = "VESSEL NAME"
-        operator = "VESSEL OPERATOR"
-        vessel_name_coordinates_list = list_vesselnames_cell_references(service_file_path)
-        # If no vessels listed, default to -
-        if not vessel_name_coordinates_list:
-            cell_value = "-"
-            row_data[lookup] = cell_value
-            raw_data_sheet.append([value for value in row_data.values()])
-        else:
-            # Fill unique fields (VESSEL NAME, VESSEL OPERATOR)
-            for cell_reference in vessel_name_coordinates_list:
-                cell_value = extract_cell(service_file_path, cell_reference)
-                row_data[lookup] = cell_value
-
-                cell_reference = "K" + cell_reference[1:]
-                cell_value = extract_cell(service_file_path, cell_reference)
-                row_data[operator] = cell_value
-            
-                # Append row to sheet
-                raw_data_sheet.append([value for value in row_data.values()])
-    
-    # # Set raw data as table
-    # sheet_dimensions = get_sheet_dimensions(file_path, raw_data_sheet_name)
-    # start_cell = "A1"
-    # end_cell = f"{get_cell_reference(sheet_dimensions[0], sheet_dimensions[1])}"
-    # cell_range = f"{start_cell}:{end_cell}"
-    
-    workbook.save(file_path)
+            workbook.save(header_only_path)
+            stream_rows_into_sheet(header_only_path, file_path, raw_data_sheet_name, row_spill.rows(),
+                                   row_spill.row_count, len(RAW_HEADERS))
+        finally:
+            row_spill.close()
+            if os.path.exists(header_only_path):
+                os.remove(header_only_path)
     return workbook
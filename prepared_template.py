@@ -0,0 +1,77 @@
+import glob
+import os
+
+from excel_manip import set_pivot_tables_refresh_on_load
+from instrumentation import recorder
+from records import RAW_HEADERS
+from service_cache import file_content_hash
+
+RAW_DATA_SHEET_NAME = "raw"
+OUTPUT_WORKBOOK_TITLE = "Service Overview"
+# Bump when prepare_template changes so prepared templates are rebuilt
+PREPARED_TEMPLATE_VERSION = 1
+
+
+def prepare_workbook(workbook):
+    """
+    Applies the template-level changes of the Service Overview to a
+    loaded template: the "raw" sheet is replaced by an empty sheet with
+    the header row, and every pivot table is set to refresh on load.
+
+    Parameters:
+    workbook (Workbook): The loaded template.
+
+    Returns:
+    Worksheet: The emptied "raw" sheet, or None if the template has none.
+    """
+    if RAW_DATA_SHEET_NAME not in workbook.sheetnames:
+        return None
+
+    del workbook[RAW_DATA_SHEET_NAME]
+    raw_data_sheet = workbook.create_sheet(RAW_DATA_SHEET_NAME)
+    workbook.active = raw_data_sheet
+    workbook.title = OUTPUT_WORKBOOK_TITLE
+    raw_data_sheet.append(list(RAW_HEADERS))
+    raw_data_sheet.freeze_panes = "A2"
+
+    # Set the refreshOnLoad attribute = True for all pivot tables in the workbook
+    set_pivot_tables_refresh_on_load(workbook)
+    return raw_data_sheet
+
+def prepared_template_path(template_file_path, cache_dir):
+    """
+    Returns the path of the prepared copy of a template (see
+    prepare_workbook), building it on first use.
+
+    Prepared templates are stored in cache_dir/templates, keyed by the
+    template's content hash, so the template-level work is done once
+    per template version. Prepared copies of older versions are removed.
+
+    Parameters:
+    template_file_path (str): The path of the template workbook.
+    cache_dir (str): Directory of the pipeline cache.
+
+    Returns:
+    str: The path of the prepared template, or None if the template has no "raw" sheet.
+    """
+    from openpyxl import load_workbook
+
+    templates_dir = os.path.join(cache_dir, "templates")
+    template_hash = file_content_hash(template_file_path)
+    prepared_path = os.path.join(templates_dir, f"v{PREPARED_TEMPLATE_VERSION}-{template_hash}.xlsx")
+    if os.path.exists(prepared_path):
+        return prepared_path
+
+    with recorder.stage("prepare_template"):
+        workbook = load_workbook(template_file_path)
+        recorder.count_workbook_load(os.path.basename(template_file_path))
+        if prepare_workbook(workbook) is None:
+            return None
+
+        os.makedirs(templates_dir, exist_ok=True)
+        for stale_path in glob.glob(os.path.join(templates_dir, "*.xlsx")):
+            os.remove(stale_path)
+        temp_path = f"{prepared_path}.tmp"
+        workbook.save(temp_path)
+        os.replace(temp_path, prepared_path)
+    return prepared_path
@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+# Column headers of the "raw" sheet, in sheet order, with the
+# ServiceRecord attribute each one is read from
+RAW_SCHEMA = (
+    ("PORT", "port"),
+    ("MICT SERVICE NAME", "mict_service_name"),
+    ("SERVICE NAME", "service_name"),
+    ("SERVICE DESC", "service_desc"),
+    ("ROUTE", "route"),
+    ("LEAD SL", "lead_sl"),
+    ("SAILING FREQ", "sailing_freq"),
+    ("PARTICIPANTS", "participants"),
+    ("VESSEL OPERATOR", None),
+    ("# OF VESSELS", "vessel_count"),
+    ("# OF VESSELS PER ROW COUNT", None),
+    ("WEEKLY CAPACITY", "weekly_capacity"),
+    ("SHIPS USED", "ships_used"),
+    ("PORT ROTATION", "port_rotation"),
+    ("ALT SRVC CD", "alt_srvc_cd"),
+    ("VESSEL SIZE", "vessel_size"),
+    ("VESSEL NAME", None),
+)
+RAW_HEADERS = tuple(header for header, _ in RAW_SCHEMA)
+HEADER_ATTRIBUTES = {header: attribute for header, attribute in RAW_SCHEMA if attribute is not None}
+
+# Columns without a ServiceRecord attribute, filled per vessel row
+VESSEL_OPERATOR_INDEX = RAW_HEADERS.index("VESSEL OPERATOR")
+ROW_COUNT_INDEX = RAW_HEADERS.index("# OF VESSELS PER ROW COUNT")
+VESSEL_NAME_INDEX = RAW_HEADERS.index("VESSEL NAME")
+
+# Per-vessel part of a raw sheet row
+VesselRow = namedtuple("VesselRow", ["name", "operator"])
+
+# Written in VESSEL NAME when a service lists no vessels
+NO_VESSEL = VesselRow("-", None)
+
+
+class ServiceRecord:
+    """
+    Fields extracted from one service file.
+
+    Service-level fields are stored once; the vessels are kept as
+    VesselRow tuples and only combined with the service fields when
+    the raw sheet rows are produced.
+
+    Fields can also be read and set by their raw sheet header,
+    e.g. record["LEAD SL"].
+    """
+    __slots__ = tuple(HEADER_ATTRIBUTES.values()) + ("vessels",)
+
+    def __init__(self):
+        for attribute in HEADER_ATTRIBUTES.values():
+            setattr(self, attribute, None)
+        self.vessels = []
+
+    def __getitem__(self, header):
+        return getattr(self, HEADER_ATTRIBUTES[header])
+
+    def __setitem__(self, header, value):
+        setattr(self, HEADER_ATTRIBUTES[header], value)
+
+    def __getstate__(self):
+        return tuple(getattr(self, attribute) for attribute in self.__slots__)
+
+    def __setstate__(self, state):
+        for attribute, value in zip(self.__slots__, state):
+            setattr(self, attribute, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, ServiceRecord):
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    def rows(self):
+        """
+        Yields the raw sheet rows of the service as tuples in
+        RAW_HEADERS order, one per vessel (a single "-" row
+        when no vessels are listed).
+        """
+        service_values = [None if attribute is None else getattr(self, attribute) for _, attribute in RAW_SCHEMA]
+        for vessel in self.vessels or [NO_VESSEL]:
+            row = list(service_values)
+            row[VESSEL_OPERATOR_INDEX] = vessel.operator
+            row[ROW_COUNT_INDEX] = 1
+            row[VESSEL_NAME_INDEX] = vessel.name
+            yield tuple(row)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import pickle
+
+
+def file_content_hash(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's content.
+
+    Parameters:
+    file_path (str): Path of the file to hash.
+
+    Returns:
+    str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ServiceRowCache:
+    """
+    Persistent on-disk cache of the ServiceRecord extracted from each service file.
+
+    Entries are keyed by the content hash of the source file and the
+    extractor version, so an unchanged Service_*.xls is served from the
+    cache while new or modified files (or a new extractor) miss.
+
+    Layout of cache_dir:
+    index.json: Maps each service file name to its current entry key.
+    rows/<key>.pkl: The pickled ServiceRecord of one entry.
+    """
+
+    def __init__(self, cache_dir, extractor_version):
+        self.cache_dir = cache_dir
+        self.extractor_version = extractor_version
+        self.rows_dir = os.path.join(cache_dir, "rows")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(self.rows_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def entry_key(self, file_hash):
+        return f"v{self.extractor_version}-{file_hash}"
+
+    def _entry_path(self, key):
+        return os.path.join(self.rows_dir, f"{key}.pkl")
+
+    def get(self, service_file, file_hash):
+        """
+        Returns the cached ServiceRecord of a service file, or None
+        if its content or the extractor version changed.
+        """
+        key = self.entry_key(file_hash)
+        try:
+            with open(self._entry_path(key), "rb") as file:
+                service_record = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        self.index[service_file] = key
+        return service_record
+
+    def put(self, service_file, file_hash, service_record):
+        """
+        Stores the ServiceRecord extracted from a service file.
+        """
+        key = self.entry_key(file_hash)
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(service_record, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, entry_path)
+        self.index[service_file] = key
+
+    def evict_missing(self, service_files):
+        """
+        Drops the entries of service files that are no longer present,
+        along with any stored records no longer referenced by the index.
+
+        Parameters:
+        service_files (list): Names of the service files in the input directory.
+
+        Returns:
+        list: Names of the evicted service files.
+        """
+        present = set(service_files)
+        evicted = [service_file for service_file in self.index if service_file not in present]
+        for service_file in evicted:
+            del self.index[service_file]
+
+        live_keys = set(self.index.values())
+        for entry_file in os.listdir(self.rows_dir):
+            key, extension = os.path.splitext(entry_file)
+            if extension == ".pkl" and key not in live_keys:
+                os.remove(os.path.join(self.rows_dir, entry_file))
+
+        return evicted
+
+    def save(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.index, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.index_path)
@@ -0,0 +1,161 @@
+import os
+import re
+
+# openpyxl and xlrd are imported by the constructors that need them, so
+# extracting .xls files never loads openpyxl (and numpy through it)
+
+# xlrd cell types (xlrd.XL_CELL_*)
+XL_CELL_EMPTY, XL_CELL_TEXT, XL_CELL_NUMBER, XL_CELL_DATE, XL_CELL_BOOLEAN, XL_CELL_ERROR, XL_CELL_BLANK = range(7)
+
+CELL_REFERENCE_PATTERN = re.compile(r"\$?([A-Za-z]{1,3})\$?([0-9]+)")
+
+def column_index_from_string(column):
+    """
+    Returns the 1-based index of a column letter, e.g. "D" -> 4.
+    """
+    column_index = 0
+    for letter in column.upper():
+        column_index = column_index * 26 + ord(letter) - ord("A") + 1
+    return column_index
+
+def coordinate_to_tuple(cell_reference):
+    """
+    Returns the 1-based (row, column) of a cell reference, e.g. "D3" -> (3, 4).
+    """
+    match = CELL_REFERENCE_PATTERN.fullmatch(cell_reference)
+    if match is None:
+        raise ValueError(f"Invalid cell reference: {cell_reference!r}")
+    return int(match.group(2)), column_index_from_string(match.group(1))
+
+def _xls_cell_value(cell, datemode):
+    """
+    Converts an xlrd cell to the value openpyxl would return for the
+    same cell once written to .xlsx: empty cells become None and whole
+    numbers become int.
+    """
+    if cell.ctype in (XL_CELL_EMPTY, XL_CELL_BLANK, XL_CELL_ERROR):
+        return None
+    if cell.ctype == XL_CELL_TEXT:
+        return cell.value if cell.value != "" else None
+    if cell.ctype == XL_CELL_NUMBER:
+        return int(cell.value) if cell.value.is_integer() else cell.value
+    if cell.ctype == XL_CELL_DATE:
+        from xlrd.xldate import xldate_as_datetime
+        return xldate_as_datetime(cell.value, datemode)
+    if cell.ctype == XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    return cell.value
+
+
+class ServiceDocument:
+    """
+    In-memory copy of the cell values of a single service sheet.
+
+    The service file is parsed once when the document is built and
+    every lookup made during extraction is answered from the stored
+    grid, so a service file is never reopened per field.
+
+    Attributes:
+    rows (list): Row tuples of cell values; row 1 of the sheet is rows[0].
+    file_path (str): Path of the file the document was built from.
+    """
+
+    def __init__(self, rows, file_path=None):
+        self.rows = rows
+        self.file_path = file_path
+
+    @staticmethod
+    def _read_rows(sheet_rows, extraction_plan):
+        # Without a plan the whole sheet is kept
+        if extraction_plan is None:
+            return [tuple(values) for values in sheet_rows]
+        return extraction_plan.read_rows(sheet_rows)
+
+    @classmethod
+    def from_xlsx(cls, file_path, extraction_plan=None):
+        """
+        Builds a document from the active sheet of an .xlsx service file.
+
+        The sheet XML is streamed in read-only mode, so no cell objects
+        or styles are built. With an extraction plan, only the columns
+        and rows the plan needs are read (see ExtractionPlan.read_rows).
+
+        Parameters:
+        file_path (str): Relative path to the .xlsx input file.
+        extraction_plan (ExtractionPlan): Bounds the rows and columns read; optional.
+
+        Returns:
+        ServiceDocument: The parsed service document.
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            sheet = workbook.active
+            max_column = extraction_plan.max_column if extraction_plan is not None else None
+            rows = cls._read_rows(sheet.iter_rows(max_col=max_column, values_only=True), extraction_plan)
+        finally:
+            workbook.close()
+        return cls(rows, file_path)
+
+    @classmethod
+    def from_xls(cls, file_path, extraction_plan=None):
+        """
+        Builds a document straight from the first sheet of a legacy
+        .xls service file, without an intermediate .xlsx copy.
+
+        The first sheet row is dropped so that cell references line up
+        with the .xlsx files produced by convert_xls_to_xlsx (e.g. the
+        service description stays at D3).
+
+        Unlike from_xlsx, this does not bound memory: xlrd parses the
+        whole BIFF sheet when it is loaded, so only the row conversion
+        stops early and the memory of a file still grows with its sheet
+        size. on_demand only skips the other sheets.
+
+        Parameters:
+        file_path (str): Relative path to the .xls input file.
+        extraction_plan (ExtractionPlan): Bounds the rows and columns converted; optional.
+
+        Returns:
+        ServiceDocument: The parsed service document.
+        """
+        import xlrd
+
+        # on_demand only parses the first sheet, but that sheet is parsed in full
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            sheet = workbook.sheet_by_index(0)
+            max_column = extraction_plan.max_column if extraction_plan is not None else None
+            sheet_rows = ([_xls_cell_value(cell, workbook.datemode)
+                           for cell in sheet.row_slice(row_index, 0, max_column)]
+                          for row_index in range(1, sheet.nrows))
+            rows = cls._read_rows(sheet_rows, extraction_plan)
+        finally:
+            workbook.release_resources()
+        return cls(rows, file_path)
+
+    @classmethod
+    def from_file(cls, file_path, extraction_plan=None):
+        """
+        Builds a document from either an .xls or an .xlsx service file.
+        """
+        if os.path.splitext(file_path)[1].lower() == ".xls":
+            return cls.from_xls(file_path, extraction_plan)
+        return cls.from_xlsx(file_path, extraction_plan)
+
+    @property
+    def max_row(self):
+        return len(self.rows)
+
+    def cell_value(self, row, column):
+        """
+        Returns the value at a 1-based row and column, or None
+        if the position lies outside of the sheet.
+        """
+        if row < 1 or column < 1 or row > len(self.rows):
+            return None
+        values = self.rows[row - 1]
+        if column > len(values):
+            return None
+        return values[column - 1]
@@ -0,0 +1,201 @@
+"""
+Parsing of the free-text fields of a service file.
+
+The service description (e.g. "CNC - China-Philippines service (Bohai-Manila
+Express - BMX)"), the "Proforma fleet" text (e.g. "5 ships (from 4,253 -
+4,636 teu)") and the Comments section are turned into the SERVICE NAME,
+LEAD SL, VESSEL SIZE, # OF VESSELS and PORT fields in one pass per string.
+
+parse_service_texts applies the same parsing to whole columns, e.g. two
+pandas Series, and returns a DataFrame when given Series.
+
+Run "python service_text.py" to check the parser against the corpus in
+service_text_corpus.json, drawn from the bundled xls/ samples.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+
+# Dash variants used in the descriptions, in the order they take precedence
+DASHES = ("-", "–", "—")
+LEAD_SL_SEPARATORS = (" - ", " – ", " — ")
+LEAD_SL_DELIMITER = " / "
+
+DASH_PATTERN = re.compile("[-–—]")
+FROM_PATTERN = re.compile("from(.*)", re.DOTALL)
+
+PORT_START_PHRASE = "Manila called at"
+PORT_END_PHRASE = "Comments - Service Chronology"
+# Checked in order; the first phrase found in the comment decides the port
+PORT_MAPPING = (
+    ("north and south", "MICT + ATI"),
+    ("north", "MICT"),
+    ("south", "ATI"),
+)
+DEFAULT_PORT = "domestic"
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service_text_corpus.json")
+
+ServiceText = namedtuple("ServiceText", ["service_name", "lead_sl", "vessel_size", "vessel_count"])
+
+
+def _text_after_last_dash(text):
+    # The dash variant listed last in DASHES wins over the others when
+    # present, whatever its position; without a dash the first character
+    # is dropped
+    last_dash_index = 0
+    for dash in DASHES:
+        index = text.rfind(dash)
+        if index > 0:
+            last_dash_index = index
+    return text[last_dash_index + 1:].strip()
+
+def parse_service_name(service_desc):
+    """
+    Returns the service name: the text in the last parentheses of the
+    description, or the text after its last dash.
+    """
+    last_open = service_desc.rfind("(")
+    last_close = service_desc.rfind(")")
+    if last_open == -1 or last_close == -1:
+        return _text_after_last_dash(service_desc)
+
+    in_parentheses = service_desc[last_open + 1:last_close] if last_close > last_open else ""
+    if DASH_PATTERN.search(in_parentheses):
+        # e.g. "(Bohai-Manila Express - BMX)": the name follows the last
+        # dash and the closing parenthesis is dropped
+        return _text_after_last_dash(service_desc)[:-1]
+    return in_parentheses
+
+def parse_lead_sl(service_desc):
+    """
+    Returns the lead shipping line: the text before the dash separating
+    the carriers from the service, up to the first " / ".
+
+    Raises:
+    ValueError: If the description has no dash separator.
+    """
+    lead_sl = None
+    for separator in LEAD_SL_SEPARATORS:
+        index = service_desc.find(separator)
+        if index != -1:
+            lead_sl = service_desc[:index]
+    if lead_sl is None:
+        raise ValueError(f"No lead shipping line separator in service description: {service_desc!r}")
+
+    if LEAD_SL_DELIMITER in lead_sl:
+        lead_sl = lead_sl.split(LEAD_SL_DELIMITER)[0].strip()
+    return lead_sl
+
+def parse_vessel_size(ships_used):
+    """
+    Returns the vessel size range of the "Proforma fleet" text,
+    e.g. "4,253 - 4,636 teu", or "-" when no range is given.
+    """
+    match = FROM_PATTERN.search(ships_used)
+    if match is None:
+        return "-"
+    return match.group(1).strip()[:-1]
+
+def parse_vessel_count(ships_used):
+    """
+    Returns the number of ships of the "Proforma fleet" text, as an int
+    when it is numeric and as the raw first word otherwise.
+    """
+    first_word = ships_used.split()[0]
+    try:
+        return int(first_word)
+    except ValueError:
+        return first_word
+
+def parse_service_text(service_desc, ships_used):
+    """
+    Parses the description and the "Proforma fleet" text of one service.
+
+    Returns:
+    ServiceText: service_name, lead_sl, vessel_size and vessel_count.
+    """
+    return ServiceText(
+        parse_service_name(service_desc),
+        parse_lead_sl(service_desc),
+        parse_vessel_size(ships_used),
+        parse_vessel_count(ships_used),
+    )
+
+def parse_service_texts(service_descs, ships_used_values):
+    """
+    Parses whole columns of descriptions and "Proforma fleet" texts.
+
+    Parameters:
+    service_descs (iterable): Service descriptions, e.g. a pandas Series.
+    ships_used_values (iterable): The matching "Proforma fleet" texts.
+
+    Returns:
+    DataFrame or list: A DataFrame with one column per ServiceText field
+    (sharing the index of service_descs) when given a pandas Series,
+    a list of ServiceText otherwise.
+    """
+    parsed = [parse_service_text(service_desc, ships_used)
+              for service_desc, ships_used in zip(service_descs, ships_used_values)]
+
+    if type(service_descs).__module__.startswith("pandas"):
+        import pandas as pd
+        return pd.DataFrame(parsed, index=service_descs.index, columns=ServiceText._fields)
+    return parsed
+
+def extract_text_between_phrases(input_string, start_phrase, end_phrase):
+    """
+    Extracts the text between two given phrases in the input string.
+
+    Parameters:
+    input_string (str): The input string to search within.
+    start_phrase (str): The phrase that marks the start of the desired text.
+    end_phrase (str): The phrase that marks the end of the desired text.
+
+    Returns:
+    str: The extracted text between the start and end phrases, or an empty string if no text is found.
+    """
+    start_index = input_string.find(start_phrase) + len(start_phrase)
+    end_index = input_string.find(end_phrase)
+
+    return input_string[start_index:end_index].strip() if start_index != -1 and end_index != -1 else ""
+
+def parse_port(comments):
+    """
+    Returns the Manila port(s) called ("MICT", "ATI", "MICT + ATI" or
+    "domestic") from the "Manila called at" line of the Comments section.
+    """
+    port_call = extract_text_between_phrases(comments, PORT_START_PHRASE, PORT_END_PHRASE).lower()
+    for search_string, port in PORT_MAPPING:
+        if search_string in port_call:
+            return port
+    return DEFAULT_PORT
+
+def verify_corpus(corpus_path=CORPUS_PATH):
+    """
+    Parses every corpus entry and returns the entries whose result
+    differs from the expected values.
+
+    Returns:
+    list: (entry, parsed values) tuples of the mismatches.
+    """
+    with open(corpus_path, encoding="utf-8") as file:
+        corpus = json.load(file)
+
+    mismatches = []
+    for entry in corpus:
+        parsed = parse_service_text(entry["service_desc"], entry["ships_used"])._asdict()
+        if "comments" in entry:
+            parsed["port"] = parse_port(entry["comments"])
+        expected = {key: entry[key] for key in parsed}
+        if parsed != expected:
+            mismatches.append((entry, parsed))
+    return mismatches
+
+if __name__ == "__main__":
+    mismatches = verify_corpus()
+    for entry, parsed in mismatches:
+        print(f"Mismatch for {entry['service_desc']!r}: expected {entry}, parsed {parsed}")
+    print("Corpus OK" if not mismatches else f"{len(mismatches)} corpus entries do not match")
+    raise SystemExit(1 if mismatches else 0)
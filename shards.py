@@ -0,0 +1,109 @@
+"""
+Per-team slices of the Service Overview.
+
+The extracted records are partitioned by PORT (MICT, ATI, MICT + ATI,
+...) or LEAD SL, and every shard is written to its own workbook from
+the template next to the combined overview, e.g.
+"Service Overview - MICT.xlsx". The shards are written by a process
+pool while the combined overview is written in the calling process.
+"""
+import contextlib
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from prepared_template import prepared_template_path
+from pop_raw import write_raw_data_sheet
+
+# --shard-by choices -> raw sheet column
+SHARD_HEADERS = {
+    "port": "PORT",
+    "lead-sl": "LEAD SL",
+}
+UNASSIGNED_SHARD = "unassigned"
+
+
+def shard_file_path(file_path, shard):
+    """
+    Returns the path of a shard workbook, e.g.
+    "Service Overview.xlsx", "MICT" -> "Service Overview - MICT.xlsx".
+    Characters not allowed in Windows file names are replaced by "-".
+    """
+    stem, extension = os.path.splitext(file_path)
+    safe_shard = re.sub(r'[<>:"/\\|?*]', "-", str(shard)).strip() or UNASSIGNED_SHARD
+    return f"{stem} - {safe_shard}{extension}"
+
+def partition_service_records(service_records, shard_by):
+    """
+    Groups extracted records by the value of a raw sheet column.
+    Files that could not be extracted are left out of every shard.
+
+    Parameters:
+    service_records (iterable): (service file name, ServiceRecord or None, error message or None) tuples.
+    shard_by (str): Raw sheet column, e.g. "PORT".
+
+    Returns:
+    dict: Shard value -> list of record tuples, in input order.
+    """
+    shards = {}
+    for service_file, service_record, error in service_records:
+        if service_record is None:
+            continue
+        shard = service_record[shard_by]
+        shards.setdefault(UNASSIGNED_SHARD if shard is None else shard, []).append((service_file, service_record, error))
+    return shards
+
+def _write_shard(template_file_path, file_path, service_records, n4_catalogue, cache_dir, static_summaries):
+    # Runs in a worker process; the per-service lines are already printed for the combined overview
+    with contextlib.redirect_stdout(io.StringIO()):
+        workbook = write_raw_data_sheet(template_file_path, file_path, service_records, n4_catalogue,
+                                        cache_dir=cache_dir, static_summaries=static_summaries, index_vessels=False)
+    return workbook is not None
+
+def write_sharded_overviews(template_file_path, file_path, service_records, n4_catalogue, shard_by, sinks=(),
+                            cache_dir=None, static_summaries=False, workers=None):
+    """
+    Writes the combined overview and one overview per shard.
+
+    Parameters:
+    template_file_path (str): The path of the template workbook.
+    file_path (str): The path of the combined overview; shards are written next to it.
+    service_records (iterable): (service file name, ServiceRecord or None, error message or None) tuples.
+    n4_catalogue (N4Catalogue): Index of the N4 service list.
+    shard_by (str): Raw sheet column the records are partitioned by, e.g. "PORT".
+    sinks (list): Additional outputs receiving the rows of the combined overview.
+    cache_dir (str): Directory of the pipeline cache holding the prepared template; optional.
+    static_summaries (bool): Write summary sheets in place of the pivot table sheets.
+    workers (int): Number of processes writing the shards; defaults to one per shard, up to the CPU count.
+
+    Returns:
+    Workbook: The saved combined overview.
+    """
+    service_records = list(service_records)
+    shards = partition_service_records(service_records, shard_by)
+    if cache_dir is not None:
+        # Prepared once here, so the shard processes only read it
+        prepared_template_path(template_file_path, cache_dir)
+
+    if workers is None:
+        workers = min(len(shards), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {}
+        for shard, shard_records in shards.items():
+            shard_path = shard_file_path(file_path, shard)
+            future = executor.submit(_write_shard, template_file_path, shard_path, shard_records, n4_catalogue,
+                                     cache_dir, static_summaries)
+            futures[future] = (shard_path, len(shard_records))
+
+        workbook = write_raw_data_sheet(template_file_path, file_path, service_records, n4_catalogue, sinks,
+                                        cache_dir, static_summaries)
+
+        for future in as_completed(futures):
+            shard_path, service_count = futures[future]
+            try:
+                if future.result():
+                    print(f"Shard written: {shard_path} ({service_count} services)")
+            except Exception as e:
+                print(f"Error: could not write {shard_path}: {e}")
+    return workbook
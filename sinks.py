@@ -0,0 +1,238 @@
+"""
+Output sinks for the raw service rows.
+
+Every sink receives the same stream as the "raw" sheet: open(headers)
+once, write(row) for each row tuple in header order, then close().
+If the run fails part way, abort() is called instead of close() and
+the previous output is left in place. They let reporting jobs query
+the service data without opening the Service Overview workbook.
+
+create_sink picks the sink from the file extension:
+.csv -> CsvSink, .db/.sqlite/.sqlite3 -> SqliteSink, .parquet -> ParquetSink.
+"""
+import csv
+import os
+import sqlite3
+
+# Columns stored as numbers by the typed sinks; a value that is not a
+# number (e.g. "n/a"), or not a whole number for INTEGER_HEADERS, is
+# stored as NULL
+FLOAT_HEADERS = ("SAILING FREQ", "WEEKLY CAPACITY")
+INTEGER_HEADERS = ("# OF VESSELS", "# OF VESSELS PER ROW COUNT")
+
+# Columns the SQLite table is indexed on
+SQLITE_INDEXED_HEADERS = ("SERVICE NAME", "PORT", "LEAD SL")
+
+
+def _to_float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+def _to_int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return None
+
+def _to_text(value):
+    return None if value is None else str(value)
+
+def _converter(header):
+    # Converts the values of a column to the type it is stored as
+    if header in FLOAT_HEADERS:
+        return _to_float
+    if header in INTEGER_HEADERS:
+        return _to_int
+    return _to_text
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _remove_file(file_path):
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+class CsvSink:
+    """
+    Streams the rows to a UTF-8 CSV file with a header line. The rows
+    are written to a temporary file that replaces the output on close.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.temp_path = f"{file_path}.tmp"
+        self.file = None
+        self.writer = None
+
+    def open(self, headers):
+        self.file = open(self.temp_path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(headers)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.replace(self.temp_path, self.file_path)
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            _remove_file(self.temp_path)
+
+
+class SqliteSink:
+    """
+    Loads the rows into a SQLite table (replaced on every run), indexed
+    on SERVICE NAME, PORT and LEAD SL. The table is replaced and the
+    rows inserted in batches within one transaction, so an aborted run
+    keeps the previous table; the indexes are built after the load.
+    """
+
+    def __init__(self, file_path, table_name="raw", batch_size=1000):
+        self.file_path = file_path
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.connection = None
+        self.batch = []
+
+    def open(self, headers):
+        self.headers = list(headers)
+        table = _quote_identifier(self.table_name)
+        column_definitions = []
+        for header in self.headers:
+            column_type = "REAL" if header in FLOAT_HEADERS else "INTEGER" if header in INTEGER_HEADERS else "TEXT"
+            column_definitions.append(f"{_quote_identifier(header)} {column_type}")
+
+        # Transactions are managed here, so the DROP TABLE is rolled back on abort
+        self.connection = sqlite3.connect(self.file_path, isolation_level=None)
+        self.connection.execute("BEGIN")
+        self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.execute(f"CREATE TABLE {table} ({', '.join(column_definitions)})")
+        self.insert_statement = f"INSERT INTO {table} VALUES ({', '.join('?' * len(self.headers))})"
+        self.converters = [_converter(header) for header in self.headers]
+
+    def write(self, row):
+        self.batch.append(tuple(converter(value) for converter, value in zip(self.converters, row)))
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            self.connection.executemany(self.insert_statement, self.batch)
+            self.batch = []
+
+    def close(self):
+        if self.connection is None:
+            return
+        self._flush()
+        for header in SQLITE_INDEXED_HEADERS:
+            if header in self.headers:
+                index_name = f"idx_{self.table_name}_{header.lower().replace(' ', '_')}"
+                self.connection.execute(f"CREATE INDEX {_quote_identifier(index_name)} "
+                                        f"ON {_quote_identifier(self.table_name)} ({_quote_identifier(header)})")
+        self.connection.execute("COMMIT")
+        self.connection.close()
+        self.connection = None
+
+    def abort(self):
+        if self.connection is None:
+            return
+        self.connection.execute("ROLLBACK")
+        self.connection.close()
+        self.connection = None
+        self.batch = []
+
+
+class ParquetSink:
+    """
+    Writes the rows to a Parquet file in row groups of batch_size rows.
+    The file is written under a temporary name and replaces the output
+    on close.
+
+    Requires pyarrow (pip install pyarrow); it is imported when the
+    sink is created, so a missing install is reported before any work.
+    """
+
+    def __init__(self, file_path, batch_size=10000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.file_path = file_path
+        self.temp_path = f"{file_path}.tmp"
+        self.batch_size = batch_size
+        self.writer = None
+        self.columns = None
+
+    def open(self, headers):
+        pa = self.pa
+        self.headers = list(headers)
+        self.schema = pa.schema([
+            (header, pa.float64() if header in FLOAT_HEADERS else pa.int64() if header in INTEGER_HEADERS else pa.string())
+            for header in self.headers
+        ])
+        self.converters = [_converter(header) for header in self.headers]
+        self.columns = [[] for _ in self.headers]
+        self.writer = self.pq.ParquetWriter(self.temp_path, self.schema)
+
+    def write(self, row):
+        for column, converter, value in zip(self.columns, self.converters, row):
+            column.append(converter(value))
+        if len(self.columns[0]) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.columns and self.columns[0]:
+            table = self.pa.Table.from_arrays(
+                [self.pa.array(column, type=field.type) for column, field in zip(self.columns, self.schema)],
+                schema=self.schema)
+            self.writer.write_table(table)
+            self.columns = [[] for _ in self.headers]
+
+    def close(self):
+        if self.writer is None:
+            return
+        self._flush()
+        self.writer.close()
+        self.writer = None
+        os.replace(self.temp_path, self.file_path)
+
+    def abort(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        _remove_file(self.temp_path)
+
+
+SINK_TYPES = {
+    ".csv": CsvSink,
+    ".db": SqliteSink,
+    ".sqlite": SqliteSink,
+    ".sqlite3": SqliteSink,
+    ".parquet": ParquetSink,
+}
+
+def create_sink(file_path):
+    """
+    Returns the sink matching the extension of an output path.
+
+    Raises:
+    ValueError: If the extension is not supported.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in SINK_TYPES:
+        raise ValueError(f"Unsupported output format: {file_path} (expected one of {', '.join(SINK_TYPES)})")
+    return SINK_TYPES[extension](file_path)
@@ -0,0 +1,158 @@
+"""
+Constant-memory assembly of the "raw" sheet.
+
+openpyxl keeps every appended cell in memory until the workbook is
+saved, so the memory of a run grows with the number of vessel rows.
+In chunked mode the rows are instead spilled to a temporary file as
+they are produced (RowSpill). The workbook is saved with the header
+row only, and stream_rows_into_sheet then copies the saved package,
+writing the spilled rows straight into the sheet XML part.
+"""
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from excel_manip import get_cell_reference
+
+# Control characters that are not allowed in XML 1.0
+ILLEGAL_XML_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+SHEET_DATA_END = b"</sheetData>"
+MAIN_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+PACKAGE_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+
+class RowSpill:
+    """
+    Temporary on-disk store of row tuples, read back in write order.
+
+    Rows are pickled in batches of batch_size, so at most one batch is
+    held in memory on either side. The file is created in directory
+    (e.g. next to the output) rather than the system temp directory,
+    which may be memory-backed.
+
+    Parameters:
+    directory (str): Directory of the temporary file; None uses the system default.
+    batch_size (int): Number of rows pickled together.
+    """
+
+    def __init__(self, directory=None, batch_size=1000):
+        self.batch_size = batch_size
+        self.batch = []
+        self.row_count = 0
+        file_descriptor, self.file_path = tempfile.mkstemp(suffix=".rows", prefix=".raw-", dir=directory)
+        self.file = os.fdopen(file_descriptor, "w+b")
+
+    def write(self, row):
+        self.batch.append(row)
+        self.row_count += 1
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            pickle.dump(self.batch, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.batch = []
+
+    def rows(self):
+        """
+        Yields the stored rows in the order they were written.
+        """
+        self._flush()
+        self.file.flush()
+        self.file.seek(0)
+        while True:
+            try:
+                batch = pickle.load(self.file)
+            except EOFError:
+                return
+            yield from batch
+
+    def close(self):
+        """
+        Deletes the temporary file.
+        """
+        self.file.close()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+
+def _cell_xml(cell_reference, value):
+    if isinstance(value, bool):
+        return f'<c r="{cell_reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{cell_reference}"><v>{value!r}</v></c>'
+    text = escape(ILLEGAL_XML_CHARACTERS.sub("", str(value)))
+    return f'<c r="{cell_reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def sheet_rows_xml(rows, first_row):
+    """
+    Yields the <row> elements of rows as encoded XML, numbering them
+    from first_row. Strings are written inline, so the package's
+    shared strings table is left untouched; empty cells are omitted.
+    """
+    from openpyxl.utils import get_column_letter
+
+    column_letters = []
+    for row_num, row in enumerate(rows, start=first_row):
+        if len(row) > len(column_letters):
+            column_letters = [get_column_letter(column) for column in range(1, len(row) + 1)]
+        cells = "".join(_cell_xml(f"{column_letter}{row_num}", value)
+                        for column_letter, value in zip(column_letters, row) if value is not None)
+        yield f'<row r="{row_num}">{cells}</row>'.encode("utf-8")
+
+def _sheet_part_name(package, sheet_name):
+    # Resolves the sheet's XML part through the workbook relationships
+    workbook = ElementTree.fromstring(package.read("xl/workbook.xml"))
+    relationships = ElementTree.fromstring(package.read("xl/_rels/workbook.xml.rels"))
+    for sheet in workbook.iter(f"{MAIN_NAMESPACE}sheet"):
+        if sheet.get("name") == sheet_name:
+            relationship_id = sheet.get(RELATIONSHIP_ID)
+            break
+    else:
+        raise ValueError(f"The sheet '{sheet_name}' doesn't exist.")
+    for relationship in relationships.iter(PACKAGE_RELATIONSHIP):
+        if relationship.get("Id") == relationship_id:
+            target = relationship.get("Target")
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    raise ValueError(f"No part found for the sheet '{sheet_name}'.")
+
+def stream_rows_into_sheet(workbook_path, file_path, sheet_name, rows, row_count, column_count):
+    """
+    Copies a saved workbook to file_path with rows appended to the
+    data of one of its sheets, without loading the rows into memory.
+
+    Parameters:
+    workbook_path (str): The saved workbook; the sheet holds its header row only.
+    file_path (str): The path of the workbook to write.
+    sheet_name (str): The sheet the rows are appended to.
+    rows (iterable): Row tuples, written from row 2.
+    row_count (int): Number of rows, for the sheet dimension.
+    column_count (int): Number of columns, for the sheet dimension.
+    """
+    with zipfile.ZipFile(workbook_path) as source, \
+            zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as target:
+        sheet_part_name = _sheet_part_name(source, sheet_name)
+        for item in source.infolist():
+            if item.filename != sheet_part_name:
+                with source.open(item) as source_part, target.open(item.filename, "w") as target_part:
+                    shutil.copyfileobj(source_part, target_part)
+                continue
+
+            sheet_xml = source.read(item)
+            last_cell = get_cell_reference(row_count + 1, max(column_count, 1))
+            sheet_xml = re.sub(rb'<dimension ref="[^"]*"\s*/>', f'<dimension ref="A1:{last_cell}"/>'.encode("ascii"),
+                               sheet_xml, count=1)
+            head, separator, tail = sheet_xml.partition(SHEET_DATA_END)
+            if not separator:
+                raise ValueError(f"The sheet '{sheet_name}' has no header row.")
+            with target.open(item.filename, "w", force_zip64=True) as target_part:
+                target_part.write(head)
+                for row_xml in sheet_rows_xml(rows, first_row=2):
+                    target_part.write(row_xml)
+                target_part.write(separator + tail)
@@ -0,0 +1,133 @@
+"""
+Static summaries of the raw rows.
+
+The template's pivot tables are refreshed by Excel when the Service
+Overview is opened, which recomputes them over the whole "raw" sheet.
+A SummaryAggregator receives the same row stream as the sinks (see
+sinks.py) and totals the vessel counts and weekly capacity by PORT,
+LEAD SL and MICT SERVICE NAME while the rows are written;
+write_summary_sheets then stores the totals as plain sheets, so they
+are readable without any pivot refresh. The pivot caches are not
+filled by the extraction, so the pivot table sheets are removed from
+overviews written with summaries rather than left showing the
+template's records.
+
+Service-level values (# OF VESSELS, WEEKLY CAPACITY) are counted once
+per service, not once per vessel row.
+"""
+from records import NO_VESSEL
+
+# Grouping column -> summary sheet title, in workbook order
+SUMMARY_SHEETS = {
+    "PORT": "sum-PORT",
+    "LEAD SL": "sum-LEAD SL",
+    "MICT SERVICE NAME": "sum-MICT SERVICE",
+}
+SUMMARY_HEADERS = ("SERVICES", "VESSELS", "# OF VESSELS", "WEEKLY CAPACITY")
+
+
+def _to_number(value):
+    # Non-numeric values such as "n/a" do not add to the totals
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return 0
+
+
+class GroupTotals:
+    """
+    Totals of one group of a summary.
+    """
+    __slots__ = ("services", "vessels", "vessel_count", "weekly_capacity")
+
+    def __init__(self):
+        self.services = set()
+        self.vessels = 0
+        self.vessel_count = 0
+        self.weekly_capacity = 0
+
+    def add(self, service, vessel_name, vessel_count, weekly_capacity):
+        if vessel_name != NO_VESSEL.name:
+            self.vessels += 1
+        if service not in self.services:
+            self.services.add(service)
+            self.vessel_count += _to_number(vessel_count)
+            self.weekly_capacity += _to_number(weekly_capacity)
+
+    def values(self):
+        return (len(self.services), self.vessels, self.vessel_count, self.weekly_capacity)
+
+
+class SummaryAggregator:
+    """
+    Totals the raw rows by each column of SUMMARY_SHEETS in a single
+    pass. Follows the sink interface: open(headers), write(row), close() or abort().
+    """
+
+    def __init__(self, group_headers=tuple(SUMMARY_SHEETS)):
+        self.group_headers = list(group_headers)
+        self.groups = {header: {} for header in self.group_headers}
+
+    def open(self, headers):
+        headers = list(headers)
+        self.group_indexes = [headers.index(header) for header in self.group_headers]
+        self.service_index = headers.index("SERVICE DESC")
+        self.vessel_name_index = headers.index("VESSEL NAME")
+        self.vessel_count_index = headers.index("# OF VESSELS")
+        self.weekly_capacity_index = headers.index("WEEKLY CAPACITY")
+
+    def write(self, row):
+        service = row[self.service_index]
+        vessel_name = row[self.vessel_name_index]
+        vessel_count = row[self.vessel_count_index]
+        weekly_capacity = row[self.weekly_capacity_index]
+        for header, index in zip(self.group_headers, self.group_indexes):
+            groups = self.groups[header]
+            totals = groups.get(row[index])
+            if totals is None:
+                totals = groups[row[index]] = GroupTotals()
+            totals.add(service, vessel_name, vessel_count, weekly_capacity)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def summary_rows(self, group_header):
+        """
+        Returns the rows of one summary: the group value followed by
+        SUMMARY_HEADERS, sorted by group value, then a TOTAL row.
+        A service belongs to a single group, so the TOTAL row is the
+        sum of the group rows.
+        """
+        groups = self.groups[group_header]
+        rows = [(key,) + groups[key].values()
+                for key in sorted(groups, key=lambda key: (key is None, str(key)))]
+        totals = tuple(sum(row[index] for row in rows) for index in range(1, len(SUMMARY_HEADERS) + 1))
+        rows.append(("TOTAL",) + totals)
+        return rows
+
+
+def write_summary_sheets(workbook, aggregator):
+    """
+    Adds one sheet per summary of the aggregator to a workbook,
+    replacing sheets of the same title.
+
+    Parameters:
+    workbook (Workbook): The output workbook.
+    aggregator (SummaryAggregator): Totals of the rows written to the "raw" sheet.
+    """
+    from excel_manip import SheetWriter
+
+    for group_header in aggregator.group_headers:
+        title = SUMMARY_SHEETS.get(group_header, f"sum-{group_header}")[:31]
+        if title in workbook.sheetnames:
+            del workbook[title]
+        sheet = workbook.create_sheet(title)
+        sheet.freeze_panes = "A2"
+
+        writer = SheetWriter(sheet)
+        writer.append((group_header,) + SUMMARY_HEADERS)
+        for row in aggregator.summary_rows(group_header):
+            writer.append(row)
+        writer.apply_column_widths()
@@ -0,0 +1,147 @@
+"""
+Cross-service index of vessels, operators and participants.
+
+The raw sheet repeats every service field on each vessel row, so
+questions such as "which services use vessel X" need the whole sheet.
+A VesselIndex is filled from the same row stream as the sinks (see
+sinks.py) and saved as JSON next to the extracted rows cache, so the
+lookups below are answered without opening any workbook:
+
+- vessel -> services it is deployed on
+- operator -> vessels it operates
+- service -> participants (the PARTICIPANTS text)
+
+Lookups ignore case and surrounding whitespace.
+"""
+import json
+import os
+
+from records import NO_VESSEL
+
+VESSEL_INDEX_FILE_NAME = "vessel_index.json"
+# Bump when the saved layout changes; other versions are not loaded
+VESSEL_INDEX_VERSION = 1
+
+
+def _normalize(name):
+    return str(name).strip().casefold()
+
+def _add_unique(values, value):
+    if value not in values:
+        values.append(value)
+
+
+class VesselIndex:
+    """
+    Maps vessels to services, operators to vessels and services to
+    their participants. Follows the sink interface: open(headers),
+    write(row), close() or abort(); close() saves the index when file_path is set.
+
+    Parameters:
+    file_path (str): JSON file the index is saved to; optional.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self.vessel_services = {}
+        self.operator_vessels = {}
+        self.service_participants = {}
+        self._lookup = None
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loads a saved index.
+
+        Raises:
+        FileNotFoundError: If no index was saved at file_path.
+        ValueError: If the file was saved by another index version.
+        """
+        with open(file_path, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != VESSEL_INDEX_VERSION:
+            raise ValueError(f"{file_path} was saved by another version of the vessel index; run the extraction again")
+
+        index = cls(file_path)
+        index.vessel_services = data["vessels"]
+        index.operator_vessels = data["operators"]
+        index.service_participants = data["services"]
+        return index
+
+    def open(self, headers):
+        headers = list(headers)
+        self.service_name_index = headers.index("SERVICE NAME")
+        self.participants_index = headers.index("PARTICIPANTS")
+        self.operator_index = headers.index("VESSEL OPERATOR")
+        self.vessel_name_index = headers.index("VESSEL NAME")
+
+    def write(self, row):
+        service_name = row[self.service_name_index]
+        operator = row[self.operator_index]
+        vessel_name = row[self.vessel_name_index]
+
+        if service_name is not None:
+            self.service_participants.setdefault(service_name, row[self.participants_index])
+        if vessel_name is None or vessel_name == NO_VESSEL.name:
+            return
+        if service_name is not None:
+            _add_unique(self.vessel_services.setdefault(vessel_name, []), service_name)
+        if operator is not None:
+            _add_unique(self.operator_vessels.setdefault(operator, []), vessel_name)
+        self._lookup = None
+
+    def close(self):
+        if self.file_path is not None:
+            self.save()
+
+    def abort(self):
+        # The index of the previous run is kept
+        pass
+
+    def save(self, file_path=None):
+        """
+        Writes the index to a JSON file, replacing it atomically.
+        """
+        file_path = file_path or self.file_path
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": VESSEL_INDEX_VERSION,
+            "vessels": self.vessel_services,
+            "operators": self.operator_vessels,
+            "services": self.service_participants,
+        }
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, file_path)
+
+    def _find(self, mapping_name, name):
+        # Normalized name -> original key, built once per mapping
+        if self._lookup is None:
+            self._lookup = {}
+        mapping = getattr(self, mapping_name)
+        lookup = self._lookup.get(mapping_name)
+        if lookup is None:
+            lookup = self._lookup[mapping_name] = {_normalize(key): key for key in mapping}
+        key = lookup.get(_normalize(name))
+        return None if key is None else mapping[key]
+
+    def services_for_vessel(self, vessel_name):
+        """
+        Returns the services a vessel is deployed on (empty if unknown).
+        """
+        return list(self._find("vessel_services", vessel_name) or [])
+
+    def vessels_for_operator(self, operator):
+        """
+        Returns the vessels operated by an operator (empty if unknown).
+        """
+        return list(self._find("operator_vessels", operator) or [])
+
+    def participants_for_service(self, service_name):
+        """
+        Returns the PARTICIPANTS text of a service, or None if unknown.
+        """
+        return self._find("service_participants", service_name)
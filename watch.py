@@ -0,0 +1,230 @@
+"""
+Watch mode: keeps the Service Overview up to date while service files
+are downloaded.
+
+The input directory (or glob pattern) is polled for new, changed and
+removed Service_*.xls files. A burst of downloads is debounced: the
+overview is rebuilt once no file has changed for the debounce period.
+Only the affected services are extracted; the records of the other
+files are kept in memory, and in the extracted rows cache between runs.
+The overview is written to a temporary file and moved over the output
+in one step, so readers never see a half-written workbook.
+
+Polling is used instead of inotify so that the same code runs in the
+Windows executable and on the Linux batch hosts.
+"""
+import os
+import time
+
+from excel_manip import convert_xls_to_xlsx, create_directory, find_service_files
+from instrumentation import recorder
+from n4_catalogue import N4_SERVICES_FILE_PATH, N4Catalogue
+from pop_raw import EXTRACTOR_VERSION, extract_all_service_records, load_service_records, write_raw_data_sheet
+from service_cache import ServiceRowCache, file_content_hash
+from sinks import create_sink
+
+
+def scan_service_files(input_path):
+    """
+    Returns the input directory and the (modification time, size) of
+    every service file, keyed by its name relative to that directory.
+    """
+    try:
+        input_dir, service_files = find_service_files(input_path)
+    except (ValueError, FileNotFoundError):
+        return "", {}
+
+    file_states = {}
+    for service_file in service_files:
+        try:
+            stat = os.stat(os.path.join(input_dir, service_file))
+        except FileNotFoundError:
+            # Removed between the listing and the stat
+            continue
+        file_states[service_file] = (stat.st_mtime_ns, stat.st_size)
+    return input_dir, file_states
+
+def replace_atomically(write, file_path):
+    """
+    Calls write(temporary path) and moves the result over file_path.
+
+    The temporary file is created next to file_path so that the final
+    os.replace stays on the same file system.
+    """
+    directory, file_name = os.path.split(os.path.abspath(file_path))
+    temp_path = os.path.join(directory, f".{file_name}.tmp")
+    try:
+        result = write(temp_path)
+        if result is not None:
+            os.replace(temp_path, file_path)
+        return result
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ServiceOverviewWatcher:
+    """
+    Rebuilds the Service Overview whenever the service files change.
+
+    Parameters:
+    input_path (str): Directory containing the Service_*.xls files, or a glob pattern.
+    template_file_path (str): The path of the template workbook.
+    output_file_path (str): The path of the Service Overview workbook to keep up to date.
+    workers (int): Number of processes used to extract the service files.
+    cache_dir (str): Directory of the extracted rows cache; None disables caching.
+    xlsx_dir (str): Debug: also write .xlsx copies of the changed service files here.
+    n4_services_file_path (str): The path of the N4 service list.
+    poll_interval (float): Seconds between two scans of the input.
+    debounce (float): Seconds without changes before the overview is rebuilt.
+    sink_paths (list): Also rewrite the raw rows to these .csv, .sqlite or .parquet files.
+    static_summaries (bool): Write summary sheets in place of the pivot table sheets.
+    """
+
+    def __init__(self, input_path, template_file_path, output_file_path, workers=1, cache_dir=None,
+                 xlsx_dir=None, n4_services_file_path=N4_SERVICES_FILE_PATH, poll_interval=1.0, debounce=2.0,
+                 sink_paths=(), static_summaries=False):
+        self.input_path = input_path
+        self.template_file_path = template_file_path
+        self.output_file_path = output_file_path
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.xlsx_dir = xlsx_dir
+        self.n4_services_file_path = n4_services_file_path
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.sink_paths = list(sink_paths)
+        self.static_summaries = static_summaries
+
+        self.input_dir = ""
+        self.file_states = {}
+        # Service file name -> (ServiceRecord or None, error message or None)
+        self.records = {}
+        self.changed_files = set()
+        self.removed_files = set()
+        self.last_change = None
+
+    def load_all(self):
+        """
+        Extracts every service file (serving unchanged ones from the
+        cache) and writes the overview.
+        """
+        self.input_dir, self.file_states = scan_service_files(self.input_path)
+        service_files = sorted(self.file_states)
+        self.records = {}
+        if service_files:
+            for service_file, service_record, error in load_service_records(
+                    service_files, self.input_dir, self.workers, self.cache_dir):
+                self.records[service_file] = (service_record, error)
+            if self.xlsx_dir:
+                create_directory(self.xlsx_dir)
+                convert_xls_to_xlsx(self.input_dir, self.xlsx_dir, service_files)
+        return self.write_overview()
+
+    def poll(self):
+        """
+        Scans the input once and records what changed since the last scan.
+
+        Returns:
+        bool: Whether any service file was added, changed or removed.
+        """
+        self.input_dir, file_states = scan_service_files(self.input_path)
+
+        changed = {service_file for service_file, state in file_states.items()
+                   if self.file_states.get(service_file) != state}
+        removed = set(self.file_states) - set(file_states)
+        self.file_states = file_states
+
+        if not changed and not removed:
+            return False
+        self.changed_files = (self.changed_files | changed) - removed
+        self.removed_files = (self.removed_files | removed) - changed
+        self.last_change = time.monotonic()
+        return True
+
+    def is_settled(self):
+        """
+        Returns whether there are pending changes and no file has
+        changed for the debounce period.
+        """
+        if not self.changed_files and not self.removed_files:
+            return False
+        return time.monotonic() - self.last_change >= self.debounce
+
+    def refresh(self):
+        """
+        Extracts the changed service files, drops the removed ones and
+        rewrites the overview.
+
+        Returns:
+        Workbook: The saved output workbook, or None if it was not written.
+        """
+        changed_files = sorted(self.changed_files)
+        removed_files = sorted(self.removed_files)
+        self.changed_files = set()
+        self.removed_files = set()
+
+        for service_file in removed_files:
+            self.records.pop(service_file, None)
+            print(f"Removed: {service_file}")
+
+        cache = ServiceRowCache(self.cache_dir, EXTRACTOR_VERSION) if self.cache_dir else None
+        changed_paths = [os.path.join(self.input_dir, service_file) for service_file in changed_files]
+        with recorder.stage("extract_changed"):
+            extracted = extract_all_service_records(changed_paths, self.workers)
+            # extracted comes first so that the generator runs to completion
+            for (service_record, error), service_file, service_file_path in zip(extracted, changed_files, changed_paths):
+                self.records[service_file] = (service_record, error)
+                if cache is not None and error is None:
+                    cache.put(service_file, file_content_hash(service_file_path), service_record)
+                print(f"{'Updated' if error is None else 'Failed'}: {service_file}")
+
+        if cache is not None:
+            cache.evict_missing(list(self.records))
+            cache.save()
+        if self.xlsx_dir and changed_files:
+            create_directory(self.xlsx_dir)
+            convert_xls_to_xlsx(self.input_dir, self.xlsx_dir, changed_files)
+        return self.write_overview()
+
+    def write_overview(self):
+        """
+        Writes the overview from the records in memory and moves it over the output.
+        """
+        n4_catalogue = N4Catalogue.load(self.n4_services_file_path, self.cache_dir)
+        service_records = ((service_file,) + self.records[service_file] for service_file in sorted(self.records))
+
+        def write(temp_path):
+            sinks = [create_sink(sink_path) for sink_path in self.sink_paths]
+            return write_raw_data_sheet(self.template_file_path, temp_path, service_records, n4_catalogue, sinks,
+                                        self.cache_dir, self.static_summaries)
+
+        try:
+            workbook = replace_atomically(write, self.output_file_path)
+        except PermissionError as e:
+            # e.g. the overview is open in Excel; retried on the next change
+            print(f"Error: could not replace {self.output_file_path}: {e}")
+            return None
+        if workbook is not None:
+            print(f"Service Overview updated: {self.output_file_path} ({len(self.records)} service files)")
+        return workbook
+
+    def run(self, max_refreshes=None):
+        """
+        Builds the overview, then polls for changes until interrupted
+        (or until max_refreshes rebuilds were made).
+        """
+        self.load_all()
+        print(f"Watching {self.input_path} for service files (Ctrl+C to stop)")
+        refreshes = 0
+        try:
+            while max_refreshes is None or refreshes < max_refreshes:
+                time.sleep(self.poll_interval)
+                self.poll()
+                if self.is_settled():
+                    started = time.perf_counter()
+                    self.refresh()
+                    refreshes += 1
+                    print(f"Refreshed in {time.perf_counter() - started:.2f} s")
+        except KeyboardInterrupt:
+            print("Stopped watching")